@@ -2,14 +2,66 @@ from WeightedGraph import *
 import math
 import numpy
 
+# Side length of the square tiles of the distance matrix computed at once, peak memory is about TILE_SIZE^2 floats
+TILE_SIZE = 2048
+
 def evaluate(pointArray, neighborsGraph, threshold):
-    successCount = 0
-    failCount = 0
-    for i in range(len(pointArray) - 1):
-        for j in range(i + 1, len(pointArray)):
-            if math.sqrt(sum(numpy.square(numpy.subtract(pointArray[i], pointArray[j])))) <= threshold:
-                if neighborsGraph.adj_matrix[i][j]: #works off of truthiness
-                   successCount += 1
-                else:
-                    failCount += 1
-    return (successCount, failCount)
\ No newline at end of file
+    # successCount: pairs within threshold that are edges, failCount: pairs within threshold that are missing
+    report = evaluate_report(pointArray, neighborsGraph, threshold)
+    return (report["success"], report["fail"])
+
+def evaluate_report(pointArray, neighborsGraph, threshold, tile_size=TILE_SIZE):
+    # evaluate plus false positives (edges between points further apart than threshold), precision and recall
+    return evaluate_thresholds(pointArray, neighborsGraph, [threshold], tile_size)[0]
+
+def evaluate_thresholds(pointArray, neighborsGraph, thresholds, tile_size=TILE_SIZE):
+    # Score one point set against several thresholds with a single pass over the pairwise distances
+    points = numpy.asarray(pointArray, dtype=float)
+    if points.ndim == 1:
+        points = points.reshape(-1, 1)
+    n = len(points)
+    thresholds = numpy.asarray(thresholds, dtype=float)
+    max_threshold = thresholds.max() if len(thresholds) else -math.inf
+
+    # Graph edges as sorted keys i * n + j with i < j, so tiles can test membership in bulk
+    u, v, _ = neighborsGraph.edge_array()
+    edge_keys = numpy.sort(u.astype(numpy.int64) * n + v.astype(numpy.int64))
+    total_edges = len(edge_keys)
+
+    success = numpy.zeros(len(thresholds), dtype=numpy.int64)
+    within = numpy.zeros(len(thresholds), dtype=numpy.int64)
+    for row_start in range(0, n, tile_size):
+        rows = points[row_start:row_start + tile_size]
+        for col_start in range(row_start, n, tile_size):
+            cols = points[col_start:col_start + tile_size]
+            distances = numpy.sqrt(numpy.sum(numpy.square(rows[:, None, :] - cols[None, :, :]), axis=2))
+            i, j = numpy.nonzero(distances <= max_threshold)
+            i, j = i + row_start, j + col_start
+            keep = i < j
+            i, j = i[keep], j[keep]
+            pair_distances = distances[i - row_start, j - col_start]
+
+            keys = i * n + j
+            pos = numpy.searchsorted(edge_keys, keys)
+            pos[pos == total_edges] = 0
+            is_edge = (edge_keys[pos] == keys) if total_edges else numpy.zeros(len(keys), dtype=bool)
+
+            for t, threshold in enumerate(thresholds):
+                mask = pair_distances <= threshold
+                within[t] += numpy.count_nonzero(mask)
+                success[t] += numpy.count_nonzero(is_edge & mask)
+
+    reports = []
+    for t, threshold in enumerate(thresholds):
+        successCount = int(success[t])
+        failCount = int(within[t]) - successCount
+        falsePositives = total_edges - successCount
+        reports.append({
+            "threshold": float(threshold),
+            "success": successCount,
+            "fail": failCount,
+            "false_positives": falsePositives,
+            "precision": successCount / total_edges if total_edges else 1.0,
+            "recall": successCount / (successCount + failCount) if successCount + failCount else 1.0
+        })
+    return reports
@@ -3,15 +3,63 @@ import heapq
 import math
 
 def depth_limited_search(graph, threshold, initialNode):
-    returnSet = set()
-    
-    def recur(currentNode, currentWeight):
-        for i in range(graph.num_nodes):
-            if (graph.adj_matrix[currentNode][i] != 0) and (graph.adj_matrix[currentNode][i] + currentWeight <= threshold):
-                returnSet.add(i)
-                recur(i, currentWeight + graph.adj_matrix[currentNode][i])
-        pass
-    
-    recur(initialNode, 0)
-    
-    return returnSet
\ No newline at end of file
+    # Set of nodes reachable from initialNode by a path of total weight <= threshold
+    return BoundedSearch(graph).reachable_set(threshold, initialNode)
+
+def bounded_shortest_paths(graph, threshold, sources):
+    # {node: shortest distance from the nearest source} for every node within threshold of a source
+    return BoundedSearch(graph).search(threshold, sources)
+
+def batch_depth_limited_search(graph, threshold, initialNodes):
+    # depth_limited_search for many start nodes, reusing one set of search buffers
+    search = BoundedSearch(graph)
+    return [search.reachable_set(threshold, node) for node in initialNodes]
+
+
+class BoundedSearch:
+    # Dijkstra that stops at threshold. Each node is settled at most once, so a query costs
+    # O(E' log V') over the V' nodes and E' edges inside the threshold instead of one call per path.
+    # The distance buffer is allocated once and only the touched entries are reset between queries.
+    def __init__(self, graph):
+        self.graph = graph
+        self.dist = [math.inf] * graph.num_nodes
+        self.touched = []
+
+    def search(self, threshold, sources):
+        dist = self.dist
+        touched = self.touched
+        heap = []
+        for source in sources:
+            if dist[source] != 0:
+                dist[source] = 0
+                touched.append(source)
+                heap.append((0, source))
+        heapq.heapify(heap)
+
+        result = {}
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node in result or d > dist[node]: # stale heap entry
+                continue
+            result[node] = d
+            for neighbor, w in self.graph.neighbors(node):
+                nd = d + w
+                if nd <= threshold and nd < dist[neighbor]:
+                    if dist[neighbor] == math.inf:
+                        touched.append(neighbor)
+                    dist[neighbor] = nd
+                    heapq.heappush(heap, (nd, neighbor))
+
+        for node in touched:
+            dist[node] = math.inf
+        touched.clear()
+        return result
+
+    def reachable_set(self, threshold, initialNode):
+        returnSet = set(self.search(threshold, [initialNode]))
+        returnSet.discard(initialNode)
+        # The old recursive search also returned initialNode when it could walk out and back along an edge,
+        # the cheapest such walk is twice its lightest edge
+        if any(2 * w <= threshold for _, w in self.graph.neighbors(initialNode)):
+            returnSet.add(initialNode)
+        return returnSet
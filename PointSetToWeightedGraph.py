@@ -1,11 +1,175 @@
 from WeightedGraph import *
-import math
+import itertools
 import numpy
 
-def generateGraph(pointSet, threshold):
-    outputGraph = WeightedGraph(len(pointSet))
-    for i in pointSet:
-        for j in pointSet:
-            if (i != j) and (math.sqrt(sum(numpy.square(numpy.subtract(i, j)))) <= threshold):
-                WeightedGraph[i][j] = math.sqrt(sum(numpy.square(numpy.subtract(i, j))))
-    return outputGraph
\ No newline at end of file
+# Max number of candidate pairs whose distances are computed in one vectorized block
+BLOCK_SIZE = 1 << 20
+# The grid checks 3^d neighboring cells, past this many dimensions blocked brute force is used instead
+MAX_GRID_DIMENSIONS = 3
+
+def generateGraph(pointSet, threshold, graph_class=SparseWeightedGraph):
+    # Connect every pair of distinct points that are at most threshold apart, weighted by their distance
+    # pointSet can be a list of points or an (n, d) numpy array
+    points = as_point_array(pointSet)
+    outputGraph = graph_class(len(points))
+    u, v, w = threshold_edges(points, threshold)
+    if hasattr(outputGraph, "add_edges"):
+        outputGraph.add_edges(u, v, w)
+    else:
+        for i, j, d in zip(u.tolist(), v.tolist(), w.tolist()):
+            outputGraph.add_edge(i, j, d)
+    if hasattr(outputGraph, "freeze"):
+        outputGraph.freeze()
+    return outputGraph
+
+def as_point_array(pointSet):
+    points = numpy.asarray(pointSet, dtype=float)
+    if points.ndim == 1:
+        points = points.reshape(-1, 1)
+    return points
+
+def threshold_edges(points, threshold, block_size=BLOCK_SIZE):
+    # Every undirected edge once as arrays (u, v, distance) with u < v and 0 < distance <= threshold
+    # Identical points are skipped, matching the old i != j check on the point values
+    n, dims = points.shape
+    if n < 2 or threshold <= 0:
+        return _empty_edges()
+
+    # Bucket points into a grid of cells with side threshold, so only neighboring cells can hold edges
+    cells = numpy.floor((points - points.min(axis=0)) / threshold).astype(numpy.int64)
+    radix = cells.max(axis=0) + 3 # + 3 leaves room for the -1 / +1 neighbor offsets
+    if dims > MAX_GRID_DIMENSIONS or numpy.prod(radix.astype(float)) >= 2 ** 62:
+        return _brute_force_edges(points, threshold, block_size)
+    multipliers = numpy.cumprod(numpy.concatenate(([1], radix[:-1])))
+    keys = (cells + 1) @ multipliers
+
+    # Sort points by cell so each cell is one contiguous run, the order inside a cell does not matter
+    order = numpy.argsort(keys)
+    sorted_points = points[order]
+    sorted_keys = keys[order]
+    cell_starts = numpy.flatnonzero(numpy.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    cell_keys = sorted_keys[cell_starts]
+    cell_counts = numpy.diff(numpy.append(cell_starts, n))
+    keys = sorted_keys = None
+
+    edges = []
+    for offset in _half_offsets(dims):
+        if not any(offset):
+            # Pairs inside the same cell
+            a_cells = numpy.arange(len(cell_keys))
+            b_cells = a_cells
+        else:
+            neighbor_keys = cell_keys + numpy.dot(offset, multipliers)
+            pos = numpy.searchsorted(cell_keys, neighbor_keys)
+            pos[pos == len(cell_keys)] = 0
+            found = cell_keys[pos] == neighbor_keys
+            a_cells = numpy.nonzero(found)[0]
+            b_cells = pos[found]
+        edges.extend(_cell_pair_edges(sorted_points, threshold, cell_starts, cell_counts,
+                                      a_cells, b_cells, not any(offset), block_size))
+
+    if not edges:
+        return _empty_edges()
+    i = numpy.concatenate([e[0] for e in edges])
+    j = numpy.concatenate([e[1] for e in edges])
+    w = numpy.concatenate([e[2] for e in edges])
+    edges = None # release the blocks before mapping
+    # Map back from sorted positions to the caller's point indices
+    i, j = order[i], order[j]
+    u = numpy.minimum(i, j)
+    numpy.maximum(i, j, out=j)
+    return u, j, w
+
+def _half_offsets(dims):
+    # The zero offset plus every neighbor offset whose first nonzero entry is positive,
+    # so each pair of neighboring cells is visited once
+    for offset in itertools.product((-1, 0, 1), repeat=dims):
+        nonzero = [o for o in offset if o != 0]
+        if not nonzero or nonzero[0] > 0:
+            yield numpy.array(offset, dtype=numpy.int64)
+
+def _cell_pair_edges(points, threshold, starts, counts, a_cells, b_cells, same_cell, block_size):
+    # Yield the edges between the points of cells a_cells[k] and b_cells[k], a block of pairs at a time
+    dense = counts[a_cells] * counts[b_cells] > block_size
+    for a, b in zip(a_cells[dense].tolist(), b_cells[dense].tolist()):
+        # One dense cell pair alone is over the block size, split it by rows
+        yield from _tiled_cell_pair_edges(points, threshold, starts[a], counts[a], starts[b], counts[b],
+                                          same_cell, block_size)
+    a_cells, b_cells = a_cells[~dense], b_cells[~dense]
+    if len(a_cells) == 0:
+        return
+
+    # One row per point of cell a, compared with the contiguous range of sorted points first..first + count
+    # of cell b, inside one cell only with the later points so every pair is seen once
+    sizes = counts[a_cells]
+    rows = numpy.arange(sizes.sum()) - numpy.repeat(numpy.cumsum(sizes) - sizes - starts[a_cells], sizes)
+    if same_cell:
+        first = rows + 1
+        row_counts = numpy.repeat(starts[a_cells] + sizes, sizes) - first
+    else:
+        first = numpy.repeat(starts[b_cells], sizes)
+        row_counts = numpy.repeat(counts[b_cells], sizes)
+    bounds = numpy.cumsum(row_counts)
+    columns = [numpy.ascontiguousarray(points[:, d]) for d in range(points.shape[1])]
+
+    lo = 0
+    while lo < len(rows):
+        # Take as many rows as fit in one block (at least one)
+        base = bounds[lo - 1] if lo else 0
+        hi = max(int(numpy.searchsorted(bounds, base + block_size, side="right")), lo + 1)
+        sizes = row_counts[lo:hi]
+        i = numpy.repeat(rows[lo:hi], sizes)
+        j = numpy.arange(len(i)) + numpy.repeat(first[lo:hi] - (bounds[lo:hi] - base - sizes), sizes)
+        lo = hi
+
+        # Squared distances a coordinate at a time, the square root only for the pairs that can be edges
+        squared = numpy.zeros(len(i))
+        for column in columns:
+            diff = column[i] - column[j]
+            squared += diff * diff
+        keep = numpy.flatnonzero((squared > 0) & (squared <= threshold * threshold * (1 + 1e-9)))
+        i, j, distances = i[keep], j[keep], numpy.sqrt(squared[keep])
+        keep = distances <= threshold
+        yield i[keep], j[keep], distances[keep]
+
+def _tiled_cell_pair_edges(points, threshold, a_start, a_count, b_start, b_count, same_cell, block_size):
+    # Edges between two cells compared as tiles of cell a's rows against cell b, at most about block_size pairs a tile
+    rows = max(1, block_size // b_count)
+    for start in range(0, a_count, rows):
+        stop = min(start + rows, a_count)
+        # inside one cell each row is only compared with the later points, so every pair is seen once
+        b_first = start + 1 if same_cell else 0
+        if b_first >= b_count:
+            break
+        diff = points[a_start + start:a_start + stop, None, :] - points[None, b_start + b_first:b_start + b_count, :]
+        distances = numpy.sqrt(numpy.sum(numpy.square(diff), axis=2))
+        i, j = numpy.nonzero((distances <= threshold) & (distances > 0))
+        d = distances[i, j]
+        i = i + a_start + start
+        j = j + b_start + b_first
+        if same_cell:
+            keep = i < j
+            i, j, d = i[keep], j[keep], d[keep]
+        yield i, j, d
+
+def _brute_force_edges(points, threshold, block_size):
+    # Fallback for high dimensional points: compare tiles of rows against all later rows
+    n = len(points)
+    rows = max(1, block_size // n)
+    edges = []
+    for start in range(0, n - 1, rows):
+        stop = min(start + rows, n - 1)
+        diff = points[start:stop, None, :] - points[None, start + 1:, :]
+        distances = numpy.sqrt(numpy.sum(numpy.square(diff), axis=2))
+        i, j = numpy.nonzero(distances <= threshold)
+        j = j + start + 1
+        i = i + start
+        keep = (j > i) & (distances[i - start, j - start - 1] > 0)
+        i, j = i[keep], j[keep]
+        edges.append((i, j, distances[i - start, j - start - 1]))
+    if not edges:
+        return _empty_edges()
+    return tuple(numpy.concatenate([e[k] for e in edges]) for k in range(3))
+
+def _empty_edges():
+    return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
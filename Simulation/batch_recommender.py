@@ -0,0 +1,96 @@
+import os
+import time
+import multiprocessing
+from models.graph_store import GraphStore
+from models.user_cache import UserCache
+from recommender import Recommender, DATA_USERS_FOLDER, DATA_GRAPH_FOLDER
+from result_io import ResultWriter, ENCODERS
+
+BATCH_OUTPUT_FILE = "data/recommendations/batch_recommendations.jsonl"
+# Users kept loaded in each worker between roots
+WORKER_MAX_USERS = 100000
+
+# Set in each worker process by _init_worker
+_worker_store = None
+_worker_folder = DATA_USERS_FOLDER
+_worker_users = None
+
+
+def _init_worker(graph_folder, users_folder, max_users=WORKER_MAX_USERS):
+    ''' Open the graph store and the user cache once per worker. The store is memory-mapped read-only,
+        so every worker shares the same physical pages through the OS page cache instead of holding a copy.
+        The cache keeps the users loaded for one root for the next roots the worker gets. '''
+    global _worker_store, _worker_folder, _worker_users
+    _worker_store = GraphStore(graph_folder) if graph_folder is not None else None
+    _worker_folder = users_folder
+    _worker_users = UserCache(max_entries=max_users)
+
+
+def _recommend_root(job):
+    ''' Run one root in a worker and return its result already encoded as one output block '''
+    root_id, max_hops, alpha, top_n, output_format = job
+    recommender = Recommender(root_id, folder=_worker_folder, store=_worker_store, users=_worker_users)
+    recommendations = recommender.create_recommendation_set(max_hops=max_hops, alpha=alpha, top_k=top_n,
+                                                            verbose=False)
+    return root_id, ENCODERS[output_format](root_id, recommendation_rows(recommendations, top_n))
+
+
+def recommendation_rows(recommendations, top_n=None):
+    ''' Best-path rows in ranked order, the same fields save_best_paths_to_json writes '''
+    rows = []
+    for user_id, data in recommendations.items():
+        if top_n is not None and len(rows) >= top_n:
+            break
+        rows.append({
+            "user_id": user_id,
+            "final_score": data["final_score"],
+            "best_path_score": data["best_path_score"],
+            "num_paths": data["num_paths"],
+            "best_path": data["best_path"]
+        })
+    return rows
+
+
+def recommend_batch(root_ids, output_file=BATCH_OUTPUT_FILE, workers=None, max_hops=3, alpha=0.8, top_n=None,
+                    graph_folder=DATA_GRAPH_FOLDER, users_folder=DATA_USERS_FOLDER, chunksize=8, progress_every=100,
+                    output_format=None, append=False, max_users=WORKER_MAX_USERS):
+    '''
+    Compute recommendations for every root in root_ids on a process pool.
+    Each finished root is appended to output_file as soon as it arrives, in completion order, as one
+    JSON line or one binary block (output_format, see result_io; by default JSONL, or the existing file's
+    format when appending). Workers encode their own blocks, so the parent only copies bytes, and
+    output_file.idx indexes every root for result_io.ResultReader.
+    Uses the graph store in graph_folder when it exists, otherwise the JSON files in users_folder.
+    Each worker keeps up to max_users loaded users (None for no limit) across the roots it runs.
+    Returns the number of roots written.
+    '''
+    root_ids = list(root_ids)
+    workers = workers or os.cpu_count() or 1
+    if not GraphStore.exists(graph_folder):
+        graph_folder = None
+
+    start = time.perf_counter()
+    done = 0
+    with ResultWriter(output_file, format=output_format, append=append) as out, \
+            multiprocessing.Pool(workers, initializer=_init_worker, initargs=(graph_folder, users_folder, max_users)) as pool:
+        jobs = [(root_id, max_hops, alpha, top_n, out.format) for root_id in root_ids]
+        for root_id, block in pool.imap_unordered(_recommend_root, jobs, chunksize=chunksize):
+            out.write_block(root_id, block)
+            done += 1
+            if progress_every and (done % progress_every == 0 or done == len(jobs)):
+                elapsed = time.perf_counter() - start
+                print(f"{done}/{len(jobs)} roots done ({done / elapsed:.1f} roots/s)")
+    return done
+
+
+def all_user_ids(graph_folder=DATA_GRAPH_FOLDER, users_folder=DATA_USERS_FOLDER):
+    ''' Every user ID in the graph store, or in the JSON folder if there is no store '''
+    if GraphStore.exists(graph_folder):
+        return range(GraphStore(graph_folder).num_users)
+    return sorted(int(name[len("user_"):-len(".json")]) for name in os.listdir(users_folder)
+                  if name.startswith("user_") and name.endswith(".json"))
+
+
+if __name__ == "__main__":
+    count = recommend_batch(all_user_ids(), output_file=BATCH_OUTPUT_FILE, max_hops=3, top_n=10)
+    print(f"Recommendations for {count} users saved to {BATCH_OUTPUT_FILE}")
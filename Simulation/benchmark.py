@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+# The point set / weighted graph modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.user_generator import UserGenerator
+from recommender import Recommender, save_best_paths_to_json
+from PointSetToWeightedGraph import generateGraph
+from DepthLimitedSearch import depth_limited_search
+
+BENCHMARK_OUTPUT_FILE = "data/benchmarks/latest.json"
+
+# Seeded social graph shapes: (name, num_users, avg_connections, num_cliques, clique sizes)
+GRAPH_CONFIGS = [
+    ("small", 200, 3, 10, (5, 10)),
+    ("medium", 1000, 3, 50, (5, 10)),
+    ("dense", 1000, 8, 100, (5, 15)),
+]
+# Seeded point sets: (name, num_points, dimensions, threshold)
+POINT_CONFIGS = [
+    ("points_2d", 5000, 2, 0.02),
+    ("points_3d", 5000, 3, 0.08),
+]
+MAX_HOPS = 2
+ROOT_USER_ID = 1
+
+
+class StageTimer:
+    ''' Times named stages, optionally recording each stage's peak traced memory '''
+
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.results = {}
+
+    def run(self, stage, function, *args, **kwargs):
+        if self.track_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        value = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        result = {"seconds": seconds}
+        if self.track_memory:
+            result["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+        self.results[stage] = result
+        return value
+
+''' End of StageTimer class '''
+
+
+def benchmark_graph(config, seed, track_memory):
+    name, num_users, avg_connections, num_cliques, (min_size, max_size) = config
+    timer = StageTimer(track_memory)
+    folder = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        random.seed(seed)
+
+        def generate():
+            generator = UserGenerator()
+            generator.generate_users(num_users, num_attributes=2)
+            generator.generate_connections(avg_connections=avg_connections)
+            generator.add_friend_cliques(num_attributes=2, num_cliques=num_cliques, min_size=min_size, max_size=max_size)
+            return generator
+
+        generator = timer.run("generate_users", generate)
+        timer.run("save_users", generator.save_users_individual, folder=os.path.join(folder, "users"))
+
+        # Cold load of every user from disk
+        loader = Recommender(ROOT_USER_ID, folder=os.path.join(folder, "users"))
+        timer.run("load_user", lambda: [loader.load_user(user_id) for user_id in range(num_users)])
+
+        recommender = Recommender(ROOT_USER_ID, folder=os.path.join(folder, "users"), users=loader.users)
+        paths, all_paths = timer.run("bfs", recommender.explore_paths, MAX_HOPS)
+        recommendations = timer.run("score_paths", recommender.score_paths, paths, all_paths)
+        ranked = timer.run("sort", recommender.rank_recommendations, recommendations)
+        timer.run("save_best_paths_to_json", save_best_paths_to_json, ranked, os.path.join(folder, "best_paths.json"))
+        timer.results["counts"] = {"recommendations": len(ranked), "paths": len(paths)}
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return timer.results
+
+def benchmark_points(config, seed, track_memory):
+    name, num_points, dimensions, threshold = config
+    timer = StageTimer(track_memory)
+    points = np.random.default_rng(seed).random((num_points, dimensions))
+    graph = timer.run("generateGraph", generateGraph, points, threshold)
+    starts = range(0, num_points, max(1, num_points // 100))
+    timer.run("depth_limited_search", lambda: [depth_limited_search(graph, 3 * threshold, s) for s in starts])
+    timer.results["counts"] = {"edges": graph.num_edges()}
+    return timer.results
+
+def run_benchmarks(seed=0, repeat=3, track_memory=True, graph_configs=GRAPH_CONFIGS, point_configs=POINT_CONFIGS):
+    '''
+    Run every config repeat times and keep the fastest time of each stage (the least noisy estimate).
+    Peak memory is the largest seen; with tracemalloc on, timings include its overhead.
+    '''
+    results = {}
+    jobs = [(config, benchmark_graph) for config in graph_configs] + [(config, benchmark_points) for config in point_configs]
+    for config, benchmark in jobs:
+        best = {}
+        for _ in range(repeat):
+            for stage, result in benchmark(config, seed, track_memory).items():
+                if stage == "counts":
+                    best[stage] = result
+                    continue
+                previous = best.setdefault(stage, dict(result))
+                previous["seconds"] = min(previous["seconds"], result["seconds"])
+                if "peak_kb" in result:
+                    previous["peak_kb"] = max(previous["peak_kb"], result["peak_kb"])
+        results[config[0]] = best
+        print(f"{config[0]}: " + ", ".join(f"{stage} {r['seconds']:.4f}s" for stage, r in best.items() if stage != "counts"))
+
+    return {
+        "meta": {
+            "seed": seed,
+            "repeat": repeat,
+            "track_memory": track_memory,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def compare_to_baseline(current, baseline, tolerance=0.25, min_seconds=0.005):
+    '''
+    Return the stages that got slower (or used more memory) than baseline by more than tolerance.
+    Stages faster than min_seconds in the baseline are too noisy to compare on time.
+    '''
+    regressions = []
+    for config, stages in current["results"].items():
+        for stage, result in stages.items():
+            before = baseline["results"].get(config, {}).get(stage)
+            if stage == "counts" or before is None:
+                continue
+            if before["seconds"] >= min_seconds and result["seconds"] > before["seconds"] * (1 + tolerance):
+                regressions.append((config, stage, "seconds", before["seconds"], result["seconds"]))
+            if "peak_kb" in before and "peak_kb" in result and result["peak_kb"] > before["peak_kb"] * (1 + tolerance):
+                regressions.append((config, stage, "peak_kb", before["peak_kb"], result["peak_kb"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the recommender and graph pipeline")
+    parser.add_argument("--output", default=BENCHMARK_OUTPUT_FILE, help="where to write the results JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against, exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a stage counts as a regression")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc for cleaner timings")
+    args = parser.parse_args()
+
+    current = run_benchmarks(seed=args.seed, repeat=args.repeat, track_memory=not args.no_memory)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=4)
+    print(f"Benchmark results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(current, baseline, tolerance=args.tolerance)
+        for config, stage, metric, before, after in regressions:
+            print(f"REGRESSION {config}/{stage} {metric}: {before:.4f} -> {after:.4f}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
@@ -1,7 +1,12 @@
 import os
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from models.graph_store import GraphStore
 
 DATA_USERS_FOLDER = "data/users"
+DATA_GRAPH_FOLDER = "data/graph"
 
 def load_all_users(folder=DATA_USERS_FOLDER):
     ''' Load all user JSON files from the specified folder and return a dictionary of user data '''
@@ -44,12 +49,212 @@ def compute_statistics(users):
     avg_mutuals = total_mutuals / n
     return avg_followers, avg_mutuals, top_user_name, max_followers
 
+class GraphStatistics:
+    ''' Running graph statistics that can be filled a chunk of users at a time and merged.
+        Degrees are kept as histograms, so memory depends on the largest degree rather than the number of users. '''
+
+    def __init__(self):
+        self.num_users = 0
+        self.total_followers = 0
+        self.total_following = 0
+        self.total_mutuals = 0 # followers that are followed back
+        self.follower_histogram = {} # degree -> number of users
+        self.following_histogram = {}
+        self.users_in_cliques = 0
+        self.clique_ids = set()
+        self.max_followers = -1
+        self.top_user_id = None
+        self.top_user_name = None
+
+    def add_user(self, data):
+        ''' Add one user dict (the JSON file format) '''
+        followers = set(data["followers"])
+        following = data["following"]
+        mutuals = sum(1 for f in following if f in followers)
+        self._add(1, len(followers), len(following), mutuals)
+        self._count(self.follower_histogram, len(followers))
+        self._count(self.following_histogram, len(following))
+        if data["cliques"]:
+            self.users_in_cliques += 1
+            self.clique_ids.update(data["cliques"])
+        self._top(len(followers), data["user_id"], data["name"])
+
+    def add_store_range(self, store, start, stop):
+        ''' Add users start .. stop - 1 of a GraphStore with array operations '''
+        if stop <= start:
+            return
+        n = store.num_users
+        ids = np.arange(start, stop, dtype=np.int64)
+        follower_counts = np.diff(store.followers_offsets[start:stop + 1])
+        following_counts = np.diff(store.following_offsets[start:stop + 1])
+
+        # u follows v is encoded as u * n + v, sorted for the binary search (rows may keep their file order)
+        following_keys = np.repeat(ids, following_counts) * n + \
+            store.following[store.following_offsets[start]:store.following_offsets[stop]]
+        if len(following_keys) > 1 and not np.all(following_keys[:-1] <= following_keys[1:]):
+            following_keys = np.sort(following_keys)
+        # A follower v of u is a mutual if u also follows v
+        follower_keys = np.repeat(ids, follower_counts) * n + \
+            store.followers[store.followers_offsets[start]:store.followers_offsets[stop]]
+        mutuals = 0
+        if len(following_keys):
+            pos = np.searchsorted(following_keys, follower_keys)
+            pos[pos == len(following_keys)] = 0
+            mutuals = int(np.count_nonzero(following_keys[pos] == follower_keys))
+
+        self._add(stop - start, int(follower_counts.sum()), int(following_counts.sum()), mutuals)
+        for histogram, counts in ((self.follower_histogram, follower_counts), (self.following_histogram, following_counts)):
+            degrees, users = np.unique(counts, return_counts=True)
+            for degree, count in zip(degrees.tolist(), users.tolist()):
+                self._count(histogram, degree, count)
+
+        clique_counts = np.diff(store.cliques_offsets[start:stop + 1])
+        self.users_in_cliques += int(np.count_nonzero(clique_counts))
+        self.clique_ids.update(np.unique(store.cliques[store.cliques_offsets[start]:store.cliques_offsets[stop]]).tolist())
+
+        top = int(np.argmax(follower_counts))
+        self._top(int(follower_counts[top]), start + top, store.name_of(start + top))
+
+    def merge(self, other):
+        ''' Fold another GraphStatistics into this one '''
+        self._add(other.num_users, other.total_followers, other.total_following, other.total_mutuals)
+        for histogram, other_histogram in ((self.follower_histogram, other.follower_histogram),
+                                           (self.following_histogram, other.following_histogram)):
+            for degree, count in other_histogram.items():
+                self._count(histogram, degree, count)
+        self.users_in_cliques += other.users_in_cliques
+        self.clique_ids |= other.clique_ids
+        if other.top_user_id is not None:
+            self._top(other.max_followers, other.top_user_id, other.top_user_name)
+        return self
+
+    def _add(self, users, followers, following, mutuals):
+        self.num_users += users
+        self.total_followers += followers
+        self.total_following += following
+        self.total_mutuals += mutuals
+
+    def _count(self, histogram, degree, count=1):
+        histogram[degree] = histogram.get(degree, 0) + count
+
+    def _top(self, followers, user_id, name):
+        # ties go to the lowest user ID so the result does not depend on chunk order
+        if followers > self.max_followers or (followers == self.max_followers and user_id < self.top_user_id):
+            self.max_followers = followers
+            self.top_user_id = user_id
+            self.top_user_name = name
+
+    def num_cliques(self):
+        return len(self.clique_ids)
+
+    def avg_followers(self):
+        return self.total_followers / self.num_users if self.num_users else 0
+
+    def avg_mutuals(self):
+        return self.total_mutuals / self.num_users if self.num_users else 0
+
+    def reciprocity(self):
+        ''' Fraction of follows that are followed back '''
+        return self.total_mutuals / self.total_followers if self.total_followers else 0
+
+    def clique_coverage(self):
+        ''' Fraction of users in at least one clique '''
+        return self.users_in_cliques / self.num_users if self.num_users else 0
+
+    def percentile(self, histogram, q):
+        ''' Smallest degree with at least q percent of users at or below it '''
+        if not histogram:
+            return 0
+        needed = q / 100 * self.num_users
+        seen = 0
+        for degree in sorted(histogram):
+            seen += histogram[degree]
+            if seen >= needed:
+                return degree
+        return max(histogram)
+
+    def report(self, percentiles=(50, 90, 99)):
+        return {
+            "total_users": self.num_users,
+            "avg_followers": self.avg_followers(),
+            "avg_mutuals": self.avg_mutuals(),
+            "top_user": self.top_user_name,
+            "max_followers": self.max_followers,
+            "reciprocity": self.reciprocity(),
+            "clique_coverage": self.clique_coverage(),
+            "num_cliques": self.num_cliques(),
+            "follower_percentiles": {q: self.percentile(self.follower_histogram, q) for q in percentiles},
+            "following_percentiles": {q: self.percentile(self.following_histogram, q) for q in percentiles},
+            "follower_histogram": dict(sorted(self.follower_histogram.items())),
+            "following_histogram": dict(sorted(self.following_histogram.items()))
+        }
+
+''' End of GraphStatistics class '''
+
+
+def _file_chunk_statistics(paths):
+    ''' Worker: statistics for a list of user JSON files '''
+    stats = GraphStatistics()
+    for path in paths:
+        with open(path, "r") as f:
+            stats.add_user(json.load(f))
+    return stats
+
+def _store_chunk_statistics(job):
+    ''' Worker: statistics for a range of users in a graph store '''
+    folder, start, stop = job
+    stats = GraphStatistics()
+    stats.add_store_range(GraphStore(folder), start, stop)
+    return stats
+
+def _iter_file_chunks(folder, chunk_size):
+    chunk = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                chunk.append(entry.path)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+def stream_statistics(folder=DATA_USERS_FOLDER, graph_folder=DATA_GRAPH_FOLDER, workers=None, chunk_size=1000, store_chunk_size=1 << 20):
+    '''
+    Compute GraphStatistics in one pass over the users without loading them all.
+    Chunks of users (JSON files, or row ranges of the graph store when there is one) are processed
+    on a process pool and the partial statistics are merged as they come back.
+    '''
+    if GraphStore.exists(graph_folder):
+        num_users = GraphStore(graph_folder).num_users
+        jobs = [(graph_folder, start, min(start + store_chunk_size, num_users)) for start in range(0, num_users, store_chunk_size)]
+        worker, chunks = _store_chunk_statistics, jobs
+    else:
+        worker, chunks = _file_chunk_statistics, _iter_file_chunks(folder, chunk_size)
+
+    workers = workers or os.cpu_count() or 1
+    stats = GraphStatistics()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep at most two chunks per worker in flight so memory does not grow with the number of users
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(worker, chunk))
+            if len(pending) >= 2 * workers:
+                stats.merge(pending.popleft().result())
+        while pending:
+            stats.merge(pending.popleft().result())
+    return stats
+
 if __name__ == "__main__":
-    users = load_all_users()
-    avg_followers, avg_mutuals, top_user, max_followers = compute_statistics(users)
+    stats = stream_statistics(folder=DATA_USERS_FOLDER, graph_folder=DATA_GRAPH_FOLDER)
+    report = stats.report()
     
     # print statistics
-    print(f"Total users: {len(users)}")
-    print(f"Average followers per user: {avg_followers:.2f}")
-    print(f"Average mutual connections per user: {avg_mutuals:.2f}")
-    print(f"User with most followers: {top_user} ({max_followers} followers)")
+    print(f"Total users: {report['total_users']}")
+    print(f"Average followers per user: {report['avg_followers']:.2f}")
+    print(f"Average mutual connections per user: {report['avg_mutuals']:.2f}")
+    print(f"User with most followers: {report['top_user']} ({report['max_followers']} followers)")
+    print(f"Reciprocity (follows that are followed back): {report['reciprocity']:.2%}")
+    print(f"Users in at least one clique: {report['clique_coverage']:.2%} ({report['num_cliques']} cliques)")
+    print("Follower degree percentiles: " + ", ".join(f"p{q} = {d}" for q, d in report["follower_percentiles"].items()))
+    print("Following degree percentiles: " + ", ".join(f"p{q} = {d}" for q, d in report["following_percentiles"].items()))
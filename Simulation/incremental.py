@@ -0,0 +1,137 @@
+import os
+import json
+from collections import namedtuple
+from models.user import User
+from models.attribute_matrix import AttributeMatrix
+from recommender import Recommender, DATA_USERS_FOLDER
+
+FOLLOW = "follow"
+UNFOLLOW = "unfollow"
+
+# follower_id starts (or stops) following followee_id
+FollowEvent = namedtuple("FollowEvent", ["kind", "follower_id", "followee_id"])
+
+
+class EventLog:
+    ''' Append-only JSON Lines log of follow/unfollow events, so batches of changes can be recorded and replayed '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, events):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            for event in events:
+                f.write(json.dumps(event._asdict()) + "\n")
+
+    def read(self, offset=0):
+        ''' Return (events after byte offset, new offset) so a consumer can resume where it stopped '''
+        if not os.path.exists(self.path):
+            return [], offset
+        with open(self.path, "r") as f:
+            f.seek(offset)
+            events = [FollowEvent(**json.loads(line)) for line in f if line.strip()]
+            return events, f.tell()
+
+''' End of EventLog class '''
+
+
+class IncrementalRecommender:
+    '''
+    Keeps the recommendations of a set of root users up to date as follow/unfollow events arrive.
+
+    A root's BFS only reads the connections of the users it expands (checking whether a neighbor follows
+    back only looks at the edge between the two), so an edge change between a and b can only change the
+    results of roots whose BFS expanded a or b. Those roots are found through a reverse index
+    (user -> roots that expanded it) and are the only ones recomputed. Recomputing them also reclassifies
+    the changed edge, e.g. a follower becomes a mutual when the reciprocal follow appears.
+    '''
+
+    def __init__(self, roots, folder=DATA_USERS_FOLDER, store=None, max_hops=3, alpha=0.8):
+        self.folder = folder
+        self.store = store
+        self.max_hops = max_hops
+        self.alpha = alpha
+        self.users = {} # shared by every root's Recommender, events are applied to these User objects
+        self.attributes = AttributeMatrix.from_store(store) if store is not None else AttributeMatrix()
+        self.recommendations = {}
+        self.visited = {}
+        self.roots_by_user = {}
+        self.changed_users = set() # not saved yet
+        self.store_changed_users = set() # differ from the store, which is never rewritten
+
+        for root in roots:
+            self.recompute(root)
+
+    def load_user(self, user_id):
+        if user_id not in self.users:
+            data = self.store.to_dict(user_id) if self.store is not None else User.load_user_data(user_id, folder=self.folder)
+            user_obj = User(user_id)
+            user_obj.from_dict(data)
+            self.users[user_id] = user_obj
+        return self.users[user_id]
+
+    def recompute(self, root):
+        ''' Rerun one root and refresh its entries in the reverse index '''
+        for user_id in self.visited.get(root, ()):
+            self.roots_by_user[user_id].discard(root)
+
+        recommender = Recommender(root, folder=self.folder, store=self.store, users=self.users,
+                                  changed_users=self.store_changed_users)
+        recommender.attributes = self.attributes
+        self.recommendations[root] = recommender.create_recommendation_set(max_hops=self.max_hops, alpha=self.alpha, verbose=False)
+        self.visited[root] = recommender.visited
+        for user_id in recommender.visited:
+            self.roots_by_user.setdefault(user_id, set()).add(root)
+
+    def affected_roots(self, user_a, user_b):
+        return self.roots_by_user.get(user_a, set()) | self.roots_by_user.get(user_b, set())
+
+    def follow(self, follower_id, followee_id):
+        return self.apply_events([FollowEvent(FOLLOW, follower_id, followee_id)])
+
+    def unfollow(self, follower_id, followee_id):
+        return self.apply_events([FollowEvent(UNFOLLOW, follower_id, followee_id)])
+
+    def apply_events(self, events):
+        '''
+        Apply a batch of events, then recompute each affected root once.
+        Returns the set of roots whose recommendations were recomputed.
+        '''
+        affected = set()
+        for event in events:
+            follower = self.load_user(event.follower_id)
+            followee = self.load_user(event.followee_id)
+            if event.kind == FOLLOW:
+                # same updates as UserGenerator.create_follower_connection
+                follower.add_following(followee.user_id)
+                followee.add_follower(follower.user_id)
+            elif event.kind == UNFOLLOW:
+                follower.remove_following(followee.user_id)
+                followee.remove_follower(follower.user_id)
+            else:
+                raise ValueError(f"Unknown event kind: {event.kind}")
+            self.changed_users.update((event.follower_id, event.followee_id))
+            self.store_changed_users.update((event.follower_id, event.followee_id))
+            affected |= self.affected_roots(event.follower_id, event.followee_id)
+
+        for root in affected:
+            self.recompute(root)
+        return affected
+
+    def replay(self, event_log, offset=0):
+        ''' Apply every event written to event_log after offset, returns the new offset '''
+        events, offset = event_log.read(offset)
+        self.apply_events(events)
+        return offset
+
+    def save_changed_users(self, folder=None):
+        ''' Write users touched by events back as JSON files, in the same format as UserGenerator.save_users_individual '''
+        folder = folder or self.folder
+        os.makedirs(folder, exist_ok=True)
+        for user_id in self.changed_users:
+            with open(os.path.join(folder, f"user_{user_id}.json"), "w") as f:
+                json.dump(self.users[user_id].to_dict(), f, indent=4)
+        self.changed_users.clear()
+
+''' End of IncrementalRecommender class '''
@@ -0,0 +1,88 @@
+import time
+from contextlib import contextmanager
+
+class RecommenderStats:
+    '''
+    Opt-in counters for Recommender, pass one as Recommender(..., stats=RecommenderStats()).
+    A Recommender without stats only pays an "is None" check at each instrumented point.
+
+    Callbacks added with add_callback(fn) are called as fn(event, data) for:
+        "stage"     {"stage", "seconds"}                       when a stage finishes
+        "expand"    {"user_id", "hop", "edges", "neighbors"}   for every user the BFS expands
+        "load_user" {"user_id", "source"}                      for every cache miss ("store" or "file")
+    '''
+
+    def __init__(self):
+        self.stage_seconds = {} # stage -> total seconds
+        self.hops = {} # hop -> {"nodes_expanded", "edges_considered", "neighbors_kept"}
+        self.cap_truncations = {"mutual": 0, "follower": 0, "following": 0} # neighbors dropped by the MAX_* caps
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.disk_loads = 0
+        self.similarity_evaluations = 0
+        self.paths = 0
+        self.candidates = 0
+        self.callbacks = []
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def emit(self, event, data):
+        for callback in self.callbacks:
+            callback(event, data)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            if self.callbacks:
+                self.emit("stage", {"stage": name, "seconds": seconds})
+
+    def record_expand(self, user_id, hop, edges, neighbors, truncated):
+        ''' truncated is (mutual, follower, following) neighbors dropped by the caps for this user '''
+        hop_stats = self.hops.setdefault(hop, {"nodes_expanded": 0, "edges_considered": 0, "neighbors_kept": 0})
+        hop_stats["nodes_expanded"] += 1
+        hop_stats["edges_considered"] += edges
+        hop_stats["neighbors_kept"] += neighbors
+        for relation, count in zip(("mutual", "follower", "following"), truncated):
+            self.cap_truncations[relation] += count
+        if self.callbacks:
+            self.emit("expand", {"user_id": user_id, "hop": hop, "edges": edges, "neighbors": neighbors})
+
+    def record_load(self, user_id, hit, source=None):
+        if hit:
+            self.cache_hits += 1
+            return
+        self.cache_misses += 1
+        self.disk_loads += 1
+        if self.callbacks:
+            self.emit("load_user", {"user_id": user_id, "source": source})
+
+    def to_dict(self):
+        return {
+            "stage_seconds": dict(self.stage_seconds),
+            "hops": {hop: dict(values) for hop, values in sorted(self.hops.items())},
+            "cap_truncations": dict(self.cap_truncations),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "disk_loads": self.disk_loads,
+            "similarity_evaluations": self.similarity_evaluations,
+            "paths": self.paths,
+            "candidates": self.candidates
+        }
+
+''' End of RecommenderStats class '''
+
+
+@contextmanager
+def maybe_stage(stats, name):
+    ''' stats.stage(name) when stats is set, otherwise nothing '''
+    if stats is None:
+        yield
+    else:
+        with stats.stage(name):
+            yield
@@ -0,0 +1,96 @@
+import numpy as np
+
+class AttributeMatrix:
+    ''' User attributes held in one contiguous (rows x num_attributes) numpy matrix.
+        With a GraphStore the store's attribute matrix is used directly (row = user ID),
+        otherwise rows are appended the first time a user's attributes are needed. '''
+
+    def __init__(self, data=None, capacity=1024):
+        self.identity = data is not None # row index is the user ID
+        self.data = data
+        self.capacity = capacity
+        self.row_of = {}
+
+    @staticmethod
+    def from_store(store):
+        return AttributeMatrix(data=store.attributes)
+
+    def rows(self, user_ids, load_attributes):
+        ''' Row indices for user_ids, load_attributes(user_id) is called for users without a row yet '''
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if self.identity:
+            return user_ids
+
+        for user_id in np.unique(user_ids).tolist():
+            if user_id not in self.row_of:
+                self._append(user_id, load_attributes(user_id))
+        return np.fromiter((self.row_of[u] for u in user_ids.tolist()), dtype=np.int64, count=len(user_ids))
+
+    def _append(self, user_id, attributes):
+        row = len(self.row_of)
+        if self.data is None:
+            self.data = np.zeros((max(self.capacity, 1), len(attributes)), dtype=np.float64)
+        elif row == len(self.data):
+            # grow by doubling so appends are amortized O(1)
+            grown = np.zeros((2 * len(self.data), self.data.shape[1]), dtype=np.float64)
+            grown[:row] = self.data
+            self.data = grown
+        self.data[row] = attributes
+        self.row_of[user_id] = row
+
+''' End of AttributeMatrix class '''
+
+
+def similarity_many(a, b):
+    ''' Vectorized Recommender.custom_similarity for each row pair of a and b, clamped to [0, 1].
+        Sums attribute by attribute in the same order as custom_similarity so the floats match exactly. '''
+    sim_sum = np.zeros(len(a), dtype=np.float64)
+    for i in range(a.shape[1]):
+        diff = 1 - np.abs(a[:, i] - b[:, i])
+        sim_sum += diff * diff
+    return np.clip(sim_sum / a.shape[1], 0.0, 1.0)
+
+
+class SimilarityTable:
+    ''' Memoized edge similarities for one recommendation request.
+        Similarity is symmetric so (u, v) and (v, u) share an entry. '''
+
+    def __init__(self, matrix, load_attributes):
+        self.matrix = matrix
+        self.load_attributes = load_attributes
+        self.memo = {}
+        self.evaluations = 0 # similarities actually computed (memo misses)
+
+    def get(self, u, v):
+        key = (u, v) if u <= v else (v, u)
+        if key not in self.memo:
+            self.compute_many(np.array([u]), np.array([v]))
+        return self.memo[key]
+
+    def compute_many(self, us, vs):
+        ''' Similarities for the edges (us[k], vs[k]) in one vectorized call, reusing memoized pairs '''
+        us = np.asarray(us, dtype=np.int64)
+        vs = np.asarray(vs, dtype=np.int64)
+        lo, hi = np.minimum(us, vs), np.maximum(us, vs)
+        pairs, inverse = np.unique(np.stack([lo, hi], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        values = np.empty(len(pairs), dtype=np.float64)
+        missing = []
+        for k, (u, v) in enumerate(pairs.tolist()):
+            cached = self.memo.get((u, v))
+            if cached is None:
+                missing.append(k)
+            else:
+                values[k] = cached
+        if missing:
+            missing = np.array(missing, dtype=np.int64)
+            self.evaluations += len(missing)
+            rows_u = self.matrix.rows(pairs[missing, 0], self.load_attributes)
+            rows_v = self.matrix.rows(pairs[missing, 1], self.load_attributes)
+            values[missing] = similarity_many(self.matrix.data[rows_u], self.matrix.data[rows_v])
+            for k, value in zip(missing.tolist(), values[missing].tolist()):
+                self.memo[(int(pairs[k, 0]), int(pairs[k, 1]))] = value
+        return values[inverse]
+
+''' End of SimilarityTable class '''
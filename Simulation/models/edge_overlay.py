@@ -0,0 +1,57 @@
+class EdgeOverlay:
+    ''' Follow/unfollow changes kept as edge deltas on top of the stored graph (a graph store or the JSON files).
+        Only the changed edges are held, per user and side: other_id -> True (edge added) or False (edge removed),
+        the last event for an edge wins. apply() puts the deltas on a user dict as it is loaded, so users
+        loaded from the store and users changed by events look the same to a Recommender. '''
+
+    def __init__(self):
+        self.deltas = {} # user_id -> {"followers": {other_id: present}, "following": {other_id: present}}
+        self.size = 0 # number of edge deltas held, an edge counts once for each of its two users
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def __contains__(self, user_id):
+        return user_id in self.deltas
+
+    def users(self):
+        return list(self.deltas)
+
+    def follow(self, follower_id, followee_id):
+        self._set(follower_id, "following", followee_id, True)
+        self._set(followee_id, "followers", follower_id, True)
+
+    def unfollow(self, follower_id, followee_id):
+        self._set(follower_id, "following", followee_id, False)
+        self._set(followee_id, "followers", follower_id, False)
+
+    def _set(self, user_id, side, other_id, present):
+        changes = self.deltas.setdefault(user_id, {"followers": {}, "following": {}})[side]
+        if other_id not in changes:
+            self.size += 1
+        changes[other_id] = present
+
+    def apply(self, data):
+        ''' Apply user_id's deltas to a user dict (the JSON file format) in place and return it '''
+        delta = self.deltas.get(data["user_id"])
+        if delta is None:
+            return data
+        for side in ("followers", "following"):
+            changes = delta[side]
+            if not changes:
+                continue
+            ids = [other_id for other_id in data[side] if changes.get(other_id, True)]
+            present = set(ids)
+            ids += [other_id for other_id, added in changes.items() if added and other_id not in present]
+            data[side] = ids
+            data["num_" + side] = len(ids)
+        return data
+
+    def clear(self):
+        self.deltas.clear()
+        self.size = 0
+
+    def stats(self):
+        return {"users": len(self.deltas), "edges": self.size}
+
+''' End of EdgeOverlay class '''
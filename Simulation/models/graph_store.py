@@ -0,0 +1,361 @@
+import os
+import json
+import shutil
+from array import array
+import numpy as np
+
+DATA_USERS_FOLDER = "data/users"
+DATA_GRAPH_FOLDER = "data/graph"
+STORE_VERSION = 1
+
+class GraphStore:
+    ''' Packed, memory-mapped social graph.
+        Followers and following are stored CSR-style: an offsets array of length num_users + 1 and one flat
+        neighbor array, so the followers of user u are followers[followers_offsets[u]:followers_offsets[u + 1]].
+        Rows keep the order of the converted JSON lists (BulkUserGenerator writes them sorted).
+        Attributes are a (num_users x num_attributes) matrix and names are a utf-8 blob with its own offsets,
+        or left out when every user has the default "User {id}" name.
+        followers_mutual / following_mutual hold one uint8 per edge of followers / following, 1 when the reverse
+        edge is in the same array too, so the recommender can tell mutuals apart without loading the neighbor.
+        User IDs are row indices, which matches the IDs written by UserGenerator (0 .. num_users - 1). '''
+
+    ARRAYS = ("followers_offsets", "followers", "following_offsets", "following",
+              "attributes", "cliques_offsets", "cliques", "name_offsets")
+    EDGE_TYPE_ARRAYS = ("followers_mutual", "following_mutual")
+
+    def __init__(self, folder=DATA_GRAPH_FOLDER, mmap=True):
+        self.folder = folder
+        with open(os.path.join(folder, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported graph store version: {self.meta.get('version')}")
+
+        self.default_names = self.meta.get("default_names", False)
+        mmap_mode = "r" if mmap else None
+        for name in self.ARRAYS:
+            if name == "name_offsets" and self.default_names:
+                continue
+            setattr(self, name, np.load(os.path.join(folder, name + ".npy"), mmap_mode=mmap_mode))
+        # stores written before the edge type index have no per-edge flags
+        self.has_edge_types = self.meta.get("edge_types", False)
+        for name in self.EDGE_TYPE_ARRAYS:
+            setattr(self, name, np.load(os.path.join(folder, name + ".npy"), mmap_mode=mmap_mode)
+                    if self.has_edge_types else None)
+        if self.default_names:
+            self.name_offsets = None
+            self.names = None
+        elif mmap:
+            self.names = np.memmap(os.path.join(folder, "names.bin"), dtype=np.uint8, mode="r") \
+                if os.path.getsize(os.path.join(folder, "names.bin")) else np.zeros(0, dtype=np.uint8)
+        else:
+            self.names = np.fromfile(os.path.join(folder, "names.bin"), dtype=np.uint8)
+
+        self.num_users = self.meta["num_users"]
+        self.num_attributes = self.meta["num_attributes"]
+
+    @staticmethod
+    def exists(folder=DATA_GRAPH_FOLDER):
+        ''' True if folder contains a graph store '''
+        return os.path.exists(os.path.join(folder, "meta.json"))
+
+    def __len__(self):
+        return self.num_users
+
+    def __contains__(self, user_id):
+        return 0 <= user_id < self.num_users
+
+    def followers_of(self, user_id):
+        ''' Array of IDs that follow user_id (a view into the mapped file) '''
+        return self.followers[self.followers_offsets[user_id]:self.followers_offsets[user_id + 1]]
+
+    def following_of(self, user_id):
+        ''' Array of IDs that user_id follows (a view into the mapped file) '''
+        return self.following[self.following_offsets[user_id]:self.following_offsets[user_id + 1]]
+
+    def mutual_followers_of(self, user_id):
+        ''' Followers of user_id that user_id follows back, from the edge type index '''
+        start, end = self.followers_offsets[user_id], self.followers_offsets[user_id + 1]
+        return self.followers[start:end][self.followers_mutual[start:end].view(bool)]
+
+    def mutual_following_of(self, user_id):
+        ''' Users user_id follows that follow user_id back, from the edge type index '''
+        start, end = self.following_offsets[user_id], self.following_offsets[user_id + 1]
+        return self.following[start:end][self.following_mutual[start:end].view(bool)]
+
+    def cliques_of(self, user_id):
+        return self.cliques[self.cliques_offsets[user_id]:self.cliques_offsets[user_id + 1]]
+
+    def attributes_of(self, user_id):
+        return self.attributes[user_id]
+
+    def name_of(self, user_id):
+        if self.default_names:
+            return f"User {user_id}"
+        start, end = self.name_offsets[user_id], self.name_offsets[user_id + 1]
+        return bytes(self.names[start:end]).decode("utf-8")
+
+    def follower_counts(self):
+        return np.diff(self.followers_offsets)
+
+    def following_counts(self):
+        return np.diff(self.following_offsets)
+
+    def to_dict(self, user_id):
+        ''' Same shape as User.to_dict, so stored users can be loaded with User.from_dict '''
+        if user_id not in self:
+            raise KeyError(f"User {user_id} is not in the graph store")
+        followers = self.followers_of(user_id).tolist()
+        following = self.following_of(user_id).tolist()
+        return {
+            "user_id": user_id,
+            "name": self.name_of(user_id),
+            "attributes": self.attributes_of(user_id).tolist(),
+            "cliques": self.cliques_of(user_id).tolist(),
+            "followers": followers,
+            "following": following,
+            "num_followers": len(followers),
+            "num_following": len(following)
+        }
+
+    @staticmethod
+    def write(folder, followers_offsets, followers, following_offsets, following, attributes,
+              cliques_offsets, cliques, names):
+        ''' Write a graph store from already-built CSR arrays.
+            names is either a list of strings, a (name_offsets, utf-8 bytes) pair or None for default names '''
+        os.makedirs(folder, exist_ok=True)
+        arrays = {
+            "followers_offsets": np.asarray(followers_offsets, dtype=np.int64),
+            "followers": np.asarray(followers, dtype=np.int32),
+            "following_offsets": np.asarray(following_offsets, dtype=np.int64),
+            "following": np.asarray(following, dtype=np.int32),
+        }
+        arrays["followers_mutual"] = reciprocal_edges(arrays["followers_offsets"], arrays["followers"])
+        arrays["following_mutual"] = reciprocal_edges(arrays["following_offsets"], arrays["following"])
+        for name, values in arrays.items():
+            np.save(os.path.join(folder, name + ".npy"), values)
+        GraphStore._write_users(folder, attributes, cliques_offsets, cliques, names, len(arrays["following"]))
+
+    @staticmethod
+    def write_streamed(folder, edge_chunks, attributes, cliques_offsets, cliques, names=None, block_size=1 << 20):
+        ''' Write a graph store from follow pairs given as a list of (src, dst) chunks, src follows dst.
+            The CSR arrays are written into the .npy files a block of block_size users at a time, so besides
+            the chunks only one direction's sorted keys and one block are in memory, never the whole edge list
+            sorted at once. Duplicate pairs collapse and rows are sorted, the same arrays as build_csr gives. '''
+        os.makedirs(folder, exist_ok=True)
+        num_users = len(attributes)
+        for name, reverse in (("following", False), ("followers", True)):
+            keys = sorted_key_chunks(edge_chunks, num_users, reverse)
+            write_csr_blocks(folder, name, keys, num_users, block_size)
+            del keys
+        store_arrays = {name: np.load(os.path.join(folder, name + ".npy"), mmap_mode="r")
+                        for name in ("followers_offsets", "followers", "following_offsets", "following")}
+        write_edge_types_blocks(folder, store_arrays, num_users, block_size)
+        GraphStore._write_users(folder, attributes, cliques_offsets, cliques, names, len(store_arrays["following"]))
+
+    @staticmethod
+    def _write_users(folder, attributes, cliques_offsets, cliques, names, num_follow_edges):
+        ''' Write everything but the follow edges, then meta.json '''
+        attributes = np.ascontiguousarray(attributes, dtype=np.float64)
+        num_users = len(cliques_offsets) - 1
+
+        if names is None:
+            name_offsets, name_blob = None, None
+        elif isinstance(names, tuple):
+            name_offsets, name_blob = names
+        else:
+            name_offsets, name_blob = encode_names(names)
+
+        arrays = {
+            "attributes": attributes.reshape(num_users, -1),
+            "cliques_offsets": np.asarray(cliques_offsets, dtype=np.int64),
+            "cliques": np.asarray(cliques, dtype=np.int32),
+        }
+        if names is not None:
+            arrays["name_offsets"] = np.asarray(name_offsets, dtype=np.int64)
+        for name, values in arrays.items():
+            np.save(os.path.join(folder, name + ".npy"), values)
+        if names is not None:
+            with open(os.path.join(folder, "names.bin"), "wb") as f:
+                f.write(bytes(name_blob))
+
+        # meta.json is written last so a half-written store is never picked up
+        with open(os.path.join(folder, "meta.json"), "w") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "num_users": num_users,
+                "num_attributes": arrays["attributes"].shape[1],
+                "num_follow_edges": int(num_follow_edges),
+                "default_names": names is None,
+                "edge_types": True
+            }, f)
+
+''' End of GraphStore class '''
+
+
+def encode_names(names):
+    ''' Pack a list of names into (offsets, utf-8 blob) '''
+    encoded = [name.encode("utf-8") for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+def build_csr(src, dst, num_users, sort_rows=True):
+    ''' Group (src, dst) pairs by src into CSR (offsets, neighbors), with each row sorted by dst.
+        With sort_rows=False each row keeps the order its pairs were given in. '''
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    if sort_rows:
+        # one sort on a combined key is much faster than lexsort on two columns
+        order = np.argsort(src * (int(dst.max()) + 1 if len(dst) else 1) + dst)
+    else:
+        order = np.argsort(src, kind="stable")
+    offsets = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_users), out=offsets[1:])
+    return offsets, dst[order].astype(np.int32)
+
+def reciprocal_edges(offsets, neighbors, chunk_size=1 << 22):
+    ''' uint8 flag per CSR edge (u, v): 1 if (v, u) is also an edge of the same CSR arrays.
+        Edges are encoded as u * n + v and sorted (already sorted when the rows are), so every reverse edge
+        is one binary search (in chunks, to bound the temporary arrays). '''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    neighbors = np.asarray(neighbors, dtype=np.int64)
+    n = len(offsets) - 1
+    owners = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    keys = owners * n + neighbors
+    if len(keys) > 1 and not np.all(keys[:-1] <= keys[1:]):
+        keys = np.sort(keys)
+
+    flags = np.zeros(len(neighbors), dtype=np.uint8)
+    for start in range(0, len(neighbors), chunk_size):
+        stop = min(start + chunk_size, len(neighbors))
+        reverse = neighbors[start:stop] * n + owners[start:stop]
+        found = np.minimum(np.searchsorted(keys, reverse), len(keys) - 1)
+        flags[start:stop] = keys[found] == reverse
+    return flags
+
+def sorted_key_chunks(edge_chunks, num_users, reverse=False, min_chunk=1 << 20):
+    ''' Sorted keys src * num_users + dst (dst * num_users + src with reverse) for each (src, dst) chunk.
+        Chunks smaller than min_chunk are merged, so many small chunks (e.g. one per clique) don't each
+        cost a binary search for every block. '''
+    chunks, pending, pending_size = [], [], 0
+    for src, dst in edge_chunks:
+        keys = np.asarray(dst, dtype=np.int64) * num_users + src if reverse else np.asarray(src, dtype=np.int64) * num_users + dst
+        if len(keys) >= min_chunk:
+            chunks.append(np.sort(keys))
+            continue
+        pending.append(keys)
+        pending_size += len(keys)
+        if pending_size >= min_chunk:
+            chunks.append(np.sort(np.concatenate(pending)))
+            pending, pending_size = [], 0
+    if pending:
+        chunks.append(np.sort(np.concatenate(pending)))
+    return chunks
+
+def write_csr_blocks(folder, name, key_chunks, num_users, block_size=1 << 20):
+    ''' Write <name>_offsets.npy and <name>.npy for pairs given as sorted key chunks (row * num_users + neighbor).
+        Rows are merged and deduplicated a block at a time and appended to a raw file as they are done;
+        the .npy header, which needs the final length, is put in front of them at the end. '''
+    n = num_users
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    path = os.path.join(folder, name + ".npy")
+    with open(path + ".part", "wb") as part:
+        for lo in range(0, n, block_size):
+            hi = min(lo + block_size, n)
+            keys = np.sort(np.concatenate([chunk[np.searchsorted(chunk, lo * n):np.searchsorted(chunk, hi * n)]
+                                           for chunk in key_chunks] or [np.zeros(0, dtype=np.int64)]))
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+            offsets[lo + 1:hi + 1] = np.bincount(keys // n - lo, minlength=hi - lo)
+            part.write((keys % n).astype("<i4").tobytes())
+    np.cumsum(offsets, out=offsets)
+    np.save(os.path.join(folder, name + "_offsets.npy"), offsets)
+
+    with open(path, "wb") as f, open(path + ".part", "rb") as part:
+        np.lib.format.write_array_header_1_0(f, {"descr": "<i4", "fortran_order": False, "shape": (int(offsets[-1]),)})
+        shutil.copyfileobj(part, f, 1 << 24)
+    os.remove(path + ".part")
+
+def write_edge_types_blocks(folder, arrays, num_users, block_size=1 << 20):
+    ''' Write followers_mutual.npy and following_mutual.npy a block of users at a time, for sorted rows.
+        A follower v of u is a mutual when u follows v, so both flags of a block come from its own two rows. '''
+    n = num_users
+    flags = {}
+    for name in ("followers", "following"):
+        path = os.path.join(folder, name + "_mutual.npy")
+        if len(arrays[name]) == 0:
+            np.save(path, np.zeros(0, dtype=np.uint8))
+        else:
+            flags[name] = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(len(arrays[name]),))
+    if not flags:
+        return
+
+    for lo in range(0, n, block_size):
+        hi = min(lo + block_size, n)
+        ids = np.arange(lo, hi, dtype=np.int64)
+        keys, spans = {}, {}
+        for name in ("followers", "following"):
+            offsets = arrays[name + "_offsets"]
+            spans[name] = (int(offsets[lo]), int(offsets[hi]))
+            keys[name] = np.repeat(ids, np.diff(offsets[lo:hi + 1])) * n + arrays[name][spans[name][0]:spans[name][1]]
+        for name, other in (("followers", "following"), ("following", "followers")):
+            if name in flags and len(keys[other]):
+                found = np.minimum(np.searchsorted(keys[other], keys[name]), len(keys[other]) - 1)
+                flags[name][spans[name][0]:spans[name][1]] = keys[other][found] == keys[name]
+    for values in flags.values():
+        values.flush()
+
+def add_edge_types(graph_folder=DATA_GRAPH_FOLDER):
+    ''' Add the edge type index to a store written before it existed '''
+    store = GraphStore(graph_folder, mmap=True)
+    if store.has_edge_types:
+        return store
+    np.save(os.path.join(graph_folder, "followers_mutual.npy"), reciprocal_edges(store.followers_offsets, store.followers))
+    np.save(os.path.join(graph_folder, "following_mutual.npy"), reciprocal_edges(store.following_offsets, store.following))
+    meta = dict(store.meta, edge_types=True)
+    with open(os.path.join(graph_folder, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return GraphStore(graph_folder)
+
+def convert_users_folder(users_folder=DATA_USERS_FOLDER, graph_folder=DATA_GRAPH_FOLDER):
+    ''' Convert a folder of user_{id}.json files (from UserGenerator.save_users_individual) into a GraphStore '''
+    # array.array keeps the edge lists compact while the JSON files are parsed one at a time
+    follower_src, follower_dst = array("q"), array("q")
+    following_src, following_dst = array("q"), array("q")
+    clique_src, clique_dst = array("q"), array("q")
+    attributes = {}
+    names = {}
+
+    for filename in os.listdir(users_folder):
+        if not (filename.startswith("user_") and filename.endswith(".json")):
+            continue
+        with open(os.path.join(users_folder, filename), "r") as f:
+            data = json.load(f)
+        user_id = data["user_id"]
+        attributes[user_id] = data["attributes"]
+        names[user_id] = data["name"]
+        follower_src.extend([user_id] * len(data["followers"]))
+        follower_dst.extend(data["followers"])
+        following_src.extend([user_id] * len(data["following"]))
+        following_dst.extend(data["following"])
+        clique_src.extend([user_id] * len(data["cliques"]))
+        clique_dst.extend(data["cliques"])
+
+    num_users = len(names)
+    if set(names) != set(range(num_users)):
+        raise ValueError("User IDs must be contiguous from 0 to use the graph store")
+
+    # Rows keep the order of the JSON lists: User.from_dict then builds the same sets as from the files, and the
+    # BFS (which keeps the first path to a user and the first MAX_* neighbors) gives the same recommendations
+    followers_offsets, followers = build_csr(follower_src, follower_dst, num_users, sort_rows=False)
+    following_offsets, following = build_csr(following_src, following_dst, num_users, sort_rows=False)
+    cliques_offsets, cliques = build_csr(clique_src, clique_dst, num_users)
+    attribute_matrix = np.array([attributes[i] for i in range(num_users)], dtype=np.float64)
+
+    GraphStore.write(graph_folder, followers_offsets, followers, following_offsets, following,
+                     attribute_matrix, cliques_offsets, cliques, [names[i] for i in range(num_users)])
+    return GraphStore(graph_folder)
+
+
+if __name__ == "__main__":
+    store = convert_users_folder(users_folder=DATA_USERS_FOLDER, graph_folder=DATA_GRAPH_FOLDER)
+    print(f"Converted {store.num_users} users to {DATA_GRAPH_FOLDER}")
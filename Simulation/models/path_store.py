@@ -0,0 +1,61 @@
+from array import array
+
+# Relations are interned as small integer codes
+RELATIONS = ("root", "mutual", "follower", "following")
+RELATION_CODES = {relation: code for code, relation in enumerate(RELATIONS)}
+
+class PathStore:
+    ''' Stores BFS paths as a trie of parent-pointer nodes.
+        Every path is one integer ID: the path ID of its prefix, the relation code of its last edge and its
+        last user. Extending a path costs O(1) memory instead of copying the whole path list, and the
+        (parent, relation, user) index makes duplicate detection O(1). Path 0 is [("root", root_id)]. '''
+
+    def __init__(self, root_id):
+        self.parents = array("q", [-1])
+        self.relations = array("b", [RELATION_CODES["root"]])
+        self.nodes = array("q", [root_id])
+        self.hops = array("q", [0])
+        self.index = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def extend(self, parent_id, relation, user_id):
+        ''' Return (path_id, is_new) for the path parent_id + [(relation, user_id)] '''
+        code = RELATION_CODES[relation]
+        key = (parent_id, code, user_id)
+        path_id = self.index.get(key)
+        if path_id is not None:
+            return path_id, False
+
+        path_id = len(self.nodes)
+        self.parents.append(parent_id)
+        self.relations.append(code)
+        self.nodes.append(user_id)
+        self.hops.append(self.hops[parent_id] + 1)
+        self.index[key] = path_id
+        return path_id, True
+
+    def last_user(self, path_id):
+        return self.nodes[path_id]
+
+    def path(self, path_id):
+        ''' Rebuild the path as the old list of (relation, user_id) tuples '''
+        path = []
+        while path_id != -1:
+            path.append((RELATIONS[self.relations[path_id]], self.nodes[path_id]))
+            path_id = self.parents[path_id]
+        path.reverse()
+        return path
+
+    def edges(self, path_id):
+        ''' (from_user, relation, to_user) for each edge of the path, from the root outwards '''
+        edges = []
+        while self.parents[path_id] != -1:
+            parent_id = self.parents[path_id]
+            edges.append((self.nodes[parent_id], RELATIONS[self.relations[path_id]], self.nodes[path_id]))
+            path_id = parent_id
+        edges.reverse()
+        return edges
+
+''' End of PathStore class '''
@@ -35,6 +35,16 @@ class User:
         self.following.add(following_id)
         self.num_following = len(self.following)
 
+    def remove_follower(self, follower_id):
+        ''' Remove a user ID from the followers set '''
+        self.followers.discard(follower_id)
+        self.num_followers = len(self.followers)
+
+    def remove_following(self, following_id):
+        ''' Remove a user ID from the following set '''
+        self.following.discard(following_id)
+        self.num_following = len(self.following)
+
 
     def seed_attributes(self, num_attributes=5):
         ''' Seed user attributes with random values between 0 and 1 '''
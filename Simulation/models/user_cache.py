@@ -0,0 +1,124 @@
+import sys
+import threading
+from collections import OrderedDict
+
+def estimate_user_bytes(user):
+    ''' Rough in-memory size of a User: the containers plus about one int object per stored ID or value '''
+    return (sys.getsizeof(user.followers) + sys.getsizeof(user.following)
+            + sys.getsizeof(user.attributes) + sys.getsizeof(user.cliques)
+            + 32 * (len(user.followers) + len(user.following) + len(user.attributes) + len(user.cliques))
+            + 512) # the User object, its name and its attribute dict
+
+class UserCache:
+    ''' Bounded LRU cache of User objects that can stand in for Recommender.users.
+        Bounded by max_entries and/or max_bytes (estimated with estimate_user_bytes); None means unbounded.
+        Pinned user IDs are never evicted, so the cache can go over budget while more users are pinned than fit.
+        Thread safe, so one cache can be shared by every Recommender in a process. '''
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # user_id -> User, least recently used first
+        self.sizes = {}
+        self.bytes = 0
+        self.pins = {} # user_id -> pin count
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, user_id):
+        return user_id in self.entries
+
+    def get(self, user_id, default=None):
+        with self.lock:
+            user = self.entries.get(user_id)
+            if user is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(user_id)
+            return user
+
+    def __getitem__(self, user_id):
+        user = self.get(user_id)
+        if user is None:
+            raise KeyError(user_id)
+        return user
+
+    def __setitem__(self, user_id, user):
+        self.put(user_id, user)
+
+    def put(self, user_id, user):
+        size = estimate_user_bytes(user) if self.max_bytes is not None else 0
+        with self.lock:
+            if user_id in self.entries:
+                self.bytes -= self.sizes[user_id]
+            self.entries[user_id] = user
+            self.entries.move_to_end(user_id)
+            self.sizes[user_id] = size
+            self.bytes += size
+            self._evict()
+
+    def discard(self, user_id):
+        ''' Drop user_id if it is cached, e.g. after its stored data changed '''
+        with self.lock:
+            if self.entries.pop(user_id, None) is not None:
+                self.bytes -= self.sizes.pop(user_id)
+
+    def pin(self, user_ids):
+        ''' Protect user_ids (loaded or not yet loaded) from eviction until unpinned '''
+        with self.lock:
+            for user_id in user_ids:
+                self.pins[user_id] = self.pins.get(user_id, 0) + 1
+
+    def unpin(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                count = self.pins.get(user_id, 0) - 1
+                if count > 0:
+                    self.pins[user_id] = count
+                else:
+                    self.pins.pop(user_id, None)
+            self._evict()
+
+    def _over_budget(self):
+        return ((self.max_entries is not None and len(self.entries) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes))
+
+    def _evict(self):
+        if not self._over_budget():
+            return
+        # Evict from the least recently used end. Pinned users are in use, so they are moved
+        # to the recently used end instead; each user is looked at most once per call.
+        for _ in range(len(self.entries)):
+            if not self._over_budget():
+                break
+            user_id = next(iter(self.entries))
+            if user_id in self.pins:
+                self.entries.move_to_end(user_id)
+                continue
+            del self.entries[user_id]
+            self.bytes -= self.sizes.pop(user_id)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "pinned": len(self.pins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+''' End of UserCache class '''
@@ -2,7 +2,13 @@ import networkx as nx
 import random
 import os
 import json
-from user import User
+import numpy as np
+try:
+    from user import User
+    from graph_store import GraphStore, build_csr, DATA_GRAPH_FOLDER
+except ImportError: # imported as models.user_generator
+    from models.user import User
+    from models.graph_store import GraphStore, build_csr, DATA_GRAPH_FOLDER
 
 class UserGenerator:
     ''' Class to generate users, their attributes, connections, and cliques'''
@@ -81,6 +87,122 @@ class UserGenerator:
 ''' End of UserGenerator class '''
 
 
+class BulkUserGenerator:
+    ''' NumPy version of UserGenerator for very large graphs (10^7+ users).
+        Users are rows of an attribute matrix and follows are (src follows dst) pairs in preallocated
+        arrays instead of User objects and networkx graphs. Seeded with numpy's default_rng so the same
+        seed and parameters always produce the same graph. Saves straight to a GraphStore. '''
+
+    def __init__(self, num_users, num_attributes=5, seed=0, block_size=1 << 20):
+        self.num_users = num_users
+        self.num_attributes = num_attributes
+        self.block_size = block_size # max new users attached per preferential attachment step
+        self.rng = np.random.default_rng(seed)
+        self.curr_clique_id = 0 # Keeps track of clique IDs
+
+        # Same as User.seed_attributes, one row per user
+        self.attributes = self.rng.random((num_users, num_attributes))
+        self.edge_chunks = [] # list of (src, dst) arrays, src follows dst
+        self.clique_chunks = [] # list of (user_ids, clique_ids) arrays
+
+    def generate_connections(self, avg_connections=3, mutual_prob=0.05):
+        ''' Barabasi albert style preferential attachment, then the same mutual / one-way split as UserGenerator.
+            Each new user attaches to avg_connections earlier users picked with probability proportional to degree,
+            by sampling from an array that holds every edge endpoint. New users are attached a block at a time,
+            each block sampling from the endpoints that exist when it starts; blocks are at most a tenth of the
+            users so far, which keeps the degree distribution close to sequential attachment. '''
+        m = avg_connections
+        n = self.num_users
+        if n <= m:
+            return
+
+        # Undirected edges (new user, earlier user), preallocated for every user after the first m
+        new_users = np.empty((n - m) * m, dtype=np.int64)
+        old_users = np.empty((n - m) * m, dtype=np.int64)
+        endpoints = np.empty(2 * (n - m) * m, dtype=np.int64)
+
+        # User m connects to the first m users, as in networkx
+        new_users[:m] = m
+        old_users[:m] = np.arange(m)
+        endpoints[:m] = np.arange(m)
+        endpoints[m:2 * m] = m
+        num_edges = m
+        num_endpoints = 2 * m
+
+        start = m + 1
+        while start < n:
+            stop = min(n, start + max(1, min(self.block_size, start // 10)))
+            count = stop - start
+            picks = endpoints[self.rng.integers(0, num_endpoints, size=(count, m))]
+
+            # Resample rows that picked the same user twice, drop whatever duplicates remain
+            for _ in range(3):
+                picks.sort(axis=1)
+                repeated = np.any(picks[:, 1:] == picks[:, :-1], axis=1)
+                if not repeated.any():
+                    break
+                picks[repeated] = endpoints[self.rng.integers(0, num_endpoints, size=(int(repeated.sum()), m))]
+            picks.sort(axis=1)
+            keep = np.ones(picks.shape, dtype=bool)
+            keep[:, 1:] = picks[:, 1:] != picks[:, :-1]
+
+            sources = np.repeat(np.arange(start, stop), m).reshape(count, m)[keep]
+            targets = picks[keep]
+            k = len(targets)
+            new_users[num_edges:num_edges + k] = sources
+            old_users[num_edges:num_edges + k] = targets
+            endpoints[num_endpoints:num_endpoints + k] = sources
+            endpoints[num_endpoints + k:num_endpoints + 2 * k] = targets
+            num_edges += k
+            num_endpoints += 2 * k
+            start = stop
+
+        new_users, old_users = new_users[:num_edges], old_users[:num_edges]
+        mutual = self.rng.random(num_edges) < mutual_prob # low chance because cliques will add more
+        # The new user follows the earlier one, mutual edges also get the reverse follow
+        self.edge_chunks.append((new_users, old_users))
+        self.edge_chunks.append((old_users[mutual], new_users[mutual]))
+
+    def add_friend_cliques(self, num_cliques=20, min_size=3, max_size=8, mutual_prob=0.8, fail_prob=0.1, attribute_shift=0.8, attribute_shift_chance=0.8):
+        ''' Same clique model as UserGenerator.add_friend_cliques, with each clique's pairs and attribute shifts done as arrays '''
+        for _ in range(num_cliques): # For each clique
+            self.curr_clique_id += 1
+            size = int(self.rng.integers(min_size, max_size + 1)) # Random size between min and max for clique
+            clique = self.rng.choice(self.num_users, size=size, replace=False) # Randomly sample users for clique
+            clique_attributes = self.rng.random(self.num_attributes) # New random target attributes for clique members
+            self.clique_chunks.append((clique, np.full(size, self.curr_clique_id, dtype=np.int64)))
+
+            # Shift attributes towards clique target
+            shift = self.rng.random((size, self.num_attributes)) < attribute_shift_chance
+            current = self.attributes[clique]
+            self.attributes[clique] = np.where(shift, clique_attributes * attribute_shift + current * (1 - attribute_shift), current)
+
+            # Every ordered pair of members: a follows b unless it fails, and b follows a back with mutual_prob
+            a = np.repeat(clique, size)
+            b = np.tile(clique, size)
+            pair = a != b
+            a, b = a[pair], b[pair]
+            created = self.rng.random(len(a)) > fail_prob
+            mutual = created & (self.rng.random(len(a)) < mutual_prob)
+            self.edge_chunks.append((a[created], b[created]))
+            self.edge_chunks.append((b[mutual], a[mutual]))
+
+    def save(self, folder=DATA_GRAPH_FOLDER, block_size=1 << 20):
+        ''' Write the graph as a GraphStore, users keep the default "User {id}" names.
+            The follow edges are streamed into the store block_size users at a time (see GraphStore.write_streamed) '''
+        n = self.num_users
+        if self.clique_chunks:
+            members = np.concatenate([c[0] for c in self.clique_chunks])
+            clique_ids = np.concatenate([c[1] for c in self.clique_chunks])
+        else:
+            members = clique_ids = np.zeros(0, dtype=np.int64)
+        cliques_offsets, cliques = build_csr(members, clique_ids, n)
+        GraphStore.write_streamed(folder, self.edge_chunks, self.attributes, cliques_offsets, cliques,
+                                  names=None, block_size=block_size)
+
+''' End of BulkUserGenerator class '''
+
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class UserPrefetcher:
+    '''
+    Loads user data on a thread pool ahead of the BFS, so blocking reads overlap with expansion.
+
+    prefetch(ids) queues IDs; at most max_in_flight reads run at once and the rest wait their turn.
+    Finished reads are kept in a bounded ready buffer (oldest dropped first) until take(id) collects them.
+    take returns None when the ID was never prefetched, was dropped or failed to load, and the caller
+    then loads it itself, so prefetching can only change when data is read, never what is read.
+    '''
+
+    def __init__(self, load_data, max_workers=16, max_in_flight=64, max_ready=4096):
+        self.load_data = load_data # user_id -> user dict, called from worker threads
+        self.max_in_flight = max_in_flight
+        self.max_ready = max_ready
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="user-prefetch")
+        # reentrant because a future that is already done runs its callback inside _fill
+        self.lock = threading.RLock()
+        self.waiting = deque()
+        self.waiting_ids = set()
+        self.in_flight = {} # user_id -> Future
+        self.ready = OrderedDict() # user_id -> user dict
+        self.claimed = set() # in flight reads a caller is already waiting on
+
+    def prefetch(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                if user_id in self.waiting_ids or user_id in self.in_flight or user_id in self.ready:
+                    continue
+                self.waiting.append(user_id)
+                self.waiting_ids.add(user_id)
+            self._fill()
+
+    def take(self, user_id):
+        with self.lock:
+            if user_id in self.ready:
+                return self.ready.pop(user_id)
+            future = self.in_flight.get(user_id)
+            self.waiting_ids.discard(user_id) # not started yet, the caller loads it now
+            if future is None:
+                return None
+            self.claimed.add(user_id) # so _done hands the result over instead of buffering it
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def close(self):
+        with self.lock:
+            self.waiting.clear()
+            self.waiting_ids.clear()
+        self.executor.shutdown(wait=True)
+
+    def _fill(self):
+        # called with the lock held
+        while self.waiting and len(self.in_flight) < self.max_in_flight:
+            user_id = self.waiting.popleft()
+            if user_id not in self.waiting_ids: # taken before it started
+                continue
+            self.waiting_ids.discard(user_id)
+            future = self.executor.submit(self.load_data, user_id)
+            self.in_flight[user_id] = future
+            future.add_done_callback(lambda f, user_id=user_id: self._done(user_id, f))
+
+    def _done(self, user_id, future):
+        with self.lock:
+            self.in_flight.pop(user_id, None)
+            if user_id in self.claimed:
+                self.claimed.discard(user_id)
+            elif future.exception() is None:
+                self.ready[user_id] = future.result()
+                while len(self.ready) > self.max_ready:
+                    self.ready.popitem(last=False)
+            self._fill()
+
+''' End of UserPrefetcher class '''
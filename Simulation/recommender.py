@@ -1,9 +1,21 @@
 import random
 import math
 import json
+import time
+import heapq
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
 from models.user import User
+from models.graph_store import GraphStore
+from models.path_store import PathStore, RELATIONS
+from models.user_cache import UserCache
+from models.attribute_matrix import AttributeMatrix, SimilarityTable
+from instrumentation import maybe_stage
+from prefetch import UserPrefetcher
 
 DATA_USERS_FOLDER = "data/users"
+DATA_GRAPH_FOLDER = "data/graph"
 ROOT_USER_ID = 1  # Default root user ID for recommendations
 
 # Connection Limits
@@ -11,20 +23,47 @@ MAX_MUTUALS = 1000  # limit mutuals connections to avoid explosion when searchin
 MAX_FOLLOWERS = 200  # limit followers connections to avoid explosion when searching paths
 MAX_FOLLOWING = 200  # limit following connections to avoid explosion when searching paths
 
+# Edge type weights applied to every edge of a path
+EDGE_WEIGHTS = {
+    "root": 1.0,
+    "following": 0.75,
+    "follower": 0.85,
+    "mutual": 0.95
+}
+
 class Recommender:
-    def __init__(self, root_user, folder=DATA_USERS_FOLDER):
+    def __init__(self, root_user, folder=DATA_USERS_FOLDER, store=None, users=None, stats=None, prefetch_workers=0, max_in_flight=64,
+                 changed_users=None, overlay=None):
         self.folder = folder
-        self.users = {}
+        self.stats = stats # optional instrumentation.RecommenderStats
+        # with prefetch_workers > 0 the users the BFS will need next are read on a thread pool
+        self.prefetcher = UserPrefetcher(self.load_user_data, max_workers=prefetch_workers, max_in_flight=max_in_flight) \
+            if prefetch_workers > 0 else None
+        self.store = store # optional GraphStore, used instead of the per-user JSON files
+        self.users = users if users is not None else {} # a dict or UserCache, pass one in to share loaded users between recommenders
+        # users whose loaded User no longer matches the store (changed by follow/unfollow events),
+        # their edges are classified from the User objects instead of the store's edge type index
+        self.changed_users = changed_users if changed_users is not None else set()
+        self.overlay = overlay # optional EdgeOverlay of follow/unfollow changes applied to every loaded user
+        self.pinned_frontier = []
+        self.visited = set() # users expanded by the last BFS
+        self.attributes = AttributeMatrix.from_store(store) if store is not None else AttributeMatrix()
         self.root_user = self.load_user(root_user)
         
 
     def load_user(self, user_id):
         # Return cached user if already loaded
-        if user_id in self.users:
-            return self.users[user_id]
-
-        # load from file
-        data = User.load_user_data(user_id, folder=self.folder)
+        user_obj = self.users.get(user_id)
+        if user_obj is not None:
+            if self.stats is not None:
+                self.stats.record_load(user_id, hit=True)
+            return user_obj
+
+        data = self.prefetcher.take(user_id) if self.prefetcher is not None else None
+        if data is None:
+            data = self.load_user_data(user_id)
+        if self.stats is not None:
+            self.stats.record_load(user_id, hit=False, source="store" if self.store is not None else "file")
         user_obj = User(user_id)
         user_obj.from_dict(data)
 
@@ -32,120 +71,503 @@ class Recommender:
         self.users[user_id] = user_obj
 
         return user_obj
+
+    def load_user_data(self, user_id):
+        # load from the graph store if there is one, otherwise from file
+        if self.store is not None:
+            data = self.store.to_dict(user_id)
+        else:
+            data = User.load_user_data(user_id, folder=self.folder)
+        if self.overlay is not None:
+            self.overlay.apply(data)
+        return data
+
+    def prefetch_connections(self, user_id):
+        """ Start reading the followers and following of user_id that are not loaded yet """
+        user = self.users.get(user_id)
+        if user is not None:
+            self.prefetcher.prefetch([f for f in user.followers if f not in self.users])
+            self.prefetcher.prefetch([f for f in user.following if f not in self.users])
+
+    def close(self):
+        """ Stop the prefetch threads, if any """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
     
 
-    def create_recommendation_set(self, max_hops=3, alpha=0.8):
+    def create_recommendation_set(self, max_hops=3, alpha=0.8, keep_paths=False, verbose=True, top_k=None, prune=True,
+                                  num_walks=None, time_budget=None, seed=0):
         """
         Discover recommendations based on a user's social graph.
         Stores ALL unique paths and produces a final score:
             final_score = best_path_score + alpha * log(1 + num_paths)
         Includes weighted edges: follower > following, mutual strongest.
+        Paths are kept in a PathStore, pass keep_paths=True to also get every path as a list in "paths".
+        With top_k only the best top_k candidates are returned (see explore_top_k).
+        With num_walks the scores are estimated from random walks instead (see explore_random_walks).
+        """
+        if top_k is not None and top_k < 1:
+            raise ValueError(f"top_k must be at least 1, got {top_k}")
+
+        if num_walks is not None:
+            if verbose:
+                print(f"Running {num_walks} random walks...")
+            with maybe_stage(self.stats, "random_walks"), self.pinned_root():
+                recommendations = self.explore_random_walks(max_hops, num_walks, time_budget=time_budget, seed=seed)
+            with maybe_stage(self.stats, "sorting"):
+                ranked = self.rank_recommendations(recommendations)
+            return ranked if top_k is None else dict(list(ranked.items())[:top_k])
+
+        if top_k is not None:
+            if verbose:
+                print(f"Running BFS to find the top {top_k} recommendations...")
+            with maybe_stage(self.stats, "top_k"), self.pinned_root():
+                return self.explore_top_k(max_hops, top_k, prune=prune)
+
+        if verbose:
+            print("Running BFS to explore connections...")
+        with maybe_stage(self.stats, "bfs"), self.pinned_root():
+            paths, all_paths = self.explore_paths(max_hops)
+
+        if verbose:
+            print("Calculating recommendation scores...")
+        with maybe_stage(self.stats, "scoring"):
+            recommendations = self.score_paths(paths, all_paths, keep_paths=keep_paths)
+
+        with maybe_stage(self.stats, "sorting"):
+            return self.rank_recommendations(recommendations)
+
+    def explore_paths(self, max_hops=3):
+        """
+        BFS from the root user.
+        Returns the PathStore and {candidate_id: [path_id, ...]} for every candidate found.
         """
+        root_id = self.root_user.user_id
+        paths = PathStore(root_id)
         all_paths = {}
 
-        # BFS queue: (current_id, hop_count, path_list)
-        queue = [(self.root_user.user_id, 0, [("root", self.root_user.user_id)])]
+        # BFS queue: (current_id, hop_count, path_id)
+        queue = deque([(root_id, 0, 0)])
         visited = set()
+        prefetched = set()
+        level = -1
 
-        print("Running BFS to explore connections...")
         while queue:
-            current_id, hop, path = queue.pop(0)
+            current_id, hop, path_id = queue.popleft()
 
             if hop > max_hops: # exceeded max hops
                 continue
 
+            if hop != level:
+                level = hop
+                self.pin_frontier(current_id, queue)
+
             if current_id in visited and hop != 0: # already visited (except root)
                 continue
 
             visited.add(current_id)
-            user_data = self.load_user(current_id)
-
-            neighbors = []
-            mutuals_found = 0
-            followers_found = 0
-            following_found = 0
-
-            # Followers → inbound relation
-            for f in user_data.followers:
-                if current_id in self.load_user(f).followers:  
-                    if mutuals_found < MAX_MUTUALS / (hop + 1): # limit mutuals
-                        mutuals_found += 1
-                        neighbors.append(("mutual", f))   # both follow each other
-                else:
-                    if followers_found < MAX_FOLLOWERS / (hop + 1): # limit followers
-                        followers_found += 1
-                        neighbors.append(("follower", f))
-
-            # Following → outbound relation
-            for f in user_data.following:
-                if current_id in self.load_user(f).following:
-                    pass
-                    # neighbors.append(("mutual", f))
-                else:
-                    if following_found < MAX_FOLLOWING / (hop + 1): # limit following
-                        following_found += 1
-                        neighbors.append(("following", f))
 
             # Explore neighbors
-            for relation, neighbor_id in neighbors:
-                new_path = path + [(relation, neighbor_id)]
+            for relation, neighbor_id in self.find_neighbors(current_id, hop):
+                new_path_id, is_new = paths.extend(path_id, relation, neighbor_id)
 
                 if (
-                    neighbor_id != self.root_user.user_id
+                    is_new
+                    and neighbor_id != root_id
                     and neighbor_id not in self.root_user.following
                 ):
-                    all_paths.setdefault(neighbor_id, [])
-                    if new_path not in all_paths[neighbor_id]:
-                        all_paths[neighbor_id].append(new_path)
-
+                    all_paths.setdefault(neighbor_id, []).append(new_path_id)
 
-                queue.append((neighbor_id, hop + 1, new_path))
+                queue.append((neighbor_id, hop + 1, new_path_id))
+                if self.prefetcher is not None and hop < max_hops and neighbor_id not in visited and neighbor_id not in prefetched:
+                    prefetched.add(neighbor_id)
+                    self.prefetch_connections(neighbor_id) # needed when neighbor_id is expanded next level
         # End of BFS loop
 
-        EDGE_WEIGHTS = {
-            "root": 1.0,
-            "following": 0.75,
-            "follower": 0.85,
-            "mutual": 0.95
-        }
+        self.visited = visited
+        if self.stats is not None:
+            self.stats.paths += len(paths) - 1
+            self.stats.candidates += len(all_paths)
+        return paths, all_paths
+
+    def explore_top_k(self, max_hops, top_k, prune=True):
+        """
+        Same BFS as explore_paths, but paths are scored as they are found and each candidate keeps
+        only its best path and path count. The top_k candidates are picked with a bounded heap.
+
+        With prune=True the last hop level (whose paths are never expanded further) is pruned
+        using the fact that an edge can at most multiply a path's weight by the largest EDGE_WEIGHTS value:
+          - an edge that cannot beat its candidate's current best path only adds to the path count,
+            it is not scored or stored
+          - a candidate first reached there is dropped when even the heaviest remaining path times the
+            largest edge weight, counted with every remaining expansion as a path, is below the current
+            k-th best score (scores only grow, so it could never enter the top k)
+        Both only skip work that cannot change the top_k result.
+        """
+        root_id = self.root_user.user_id
+        similarities = self.similarity_table()
+        paths = PathStore(root_id)
+        weights = [1.0] # path weight for each path ID
+        best = {} # candidate_id -> [best path weight, best path ID, num_paths]
+        max_edge_weight = max(weight for relation, weight in EDGE_WEIGHTS.items() if relation != "root")
+
+        queue = deque([(root_id, 0, 0)])
+        visited = set()
+        prefetched = set()
+        level = -1
+        last_level = False
+        bar = 0.0 # k-th best final score so far
+        level_weight_bound = 1.0 # heaviest path weight left to expand on the last level
+
+        while queue:
+            current_id, hop, path_id = queue.popleft()
+
+            if hop > max_hops: # exceeded max hops
+                continue
+
+            if current_id in visited and hop != 0: # already visited (except root)
+                continue
+
+            if hop != level:
+                level = hop
+                self.pin_frontier(current_id, queue)
+
+            if prune and hop == max_hops and not last_level:
+                last_level = True
+                level_weight_bound = max([weights[path_id]] + [weights[entry[2]] for entry in queue])
+                if len(best) >= top_k:
+                    bar = heapq.nlargest(top_k, (w * w * math.log(1 + n) for w, _, n in best.values()))[-1]
+
+            visited.add(current_id)
+
+            neighbors = self.find_neighbors(current_id, hop)
+            if last_level:
+                edge_bound = weights[path_id] * max_edge_weight
+                new_candidate_bound = (level_weight_bound * max_edge_weight) ** 2 * math.log(2 + len(queue))
+                scored = []
+                for relation, neighbor_id in neighbors:
+                    if neighbor_id == root_id or neighbor_id in self.root_user.following:
+                        continue
+                    entry = best.get(neighbor_id)
+                    if entry is not None and entry[0] >= edge_bound:
+                        entry[2] += 1 # cannot become the best path, only counts
+                    elif entry is not None or new_candidate_bound >= bar:
+                        scored.append((relation, neighbor_id))
+                neighbors = scored
+            if not neighbors:
+                continue
+            edge_similarity = similarities.compute_many([current_id] * len(neighbors), [n for _, n in neighbors])
+
+            for (relation, neighbor_id), similarity in zip(neighbors, edge_similarity.tolist()):
+                new_path_id, is_new = paths.extend(path_id, relation, neighbor_id)
+                if is_new:
+                    weight = weights[path_id] * similarity * EDGE_WEIGHTS.get(relation, 1.0)
+                    weights.append(weight)
+
+                if (
+                    is_new
+                    and neighbor_id != root_id
+                    and neighbor_id not in self.root_user.following
+                ):
+                    entry = best.get(neighbor_id)
+                    if entry is None:
+                        best[neighbor_id] = [weight, new_path_id, 1]
+                    else:
+                        entry[2] += 1
+                        if weight > entry[0]:
+                            entry[0] = weight
+                            entry[1] = new_path_id
+
+                if hop < max_hops: # paths past max_hops are never expanded
+                    queue.append((neighbor_id, hop + 1, new_path_id))
+                    if self.prefetcher is not None and neighbor_id not in visited and neighbor_id not in prefetched:
+                        prefetched.add(neighbor_id)
+                        self.prefetch_connections(neighbor_id) # needed when neighbor_id is expanded next level
+        # End of BFS loop
 
-        def path_weight(path):
-            ''' Inside function to calculate weight of a given path '''
-            hop_count = len(path) - 1
-            if hop_count == 0:
-                return 0
+        self.visited = visited
+        if self.stats is not None:
+            self.stats.paths += len(paths) - 1
+            self.stats.candidates += len(best)
+            self.stats.similarity_evaluations += similarities.evaluations
 
-            prev_id = path[0][1] # start with root user
-            weight = 1.0
-            for relation, curr_id in path[1:]:
-                weight *= self.calculate_similarity_weight(prev_id, curr_id) ## apply similarity weight
-                weight *= EDGE_WEIGHTS.get(relation, 1.0) # apply edge type weight
-                prev_id = curr_id
+        def final_score(item):
+            weight, _, num_paths = item[1]
+            return (weight * weight) * math.log(1 + num_paths)
 
-            weight = weight * weight # favor stronger connections more heavily
-            return weight
+        recommendations = {}
+        for user_id, (weight, best_path_id, num_paths) in heapq.nlargest(top_k, best.items(), key=final_score):
+            best_score = weight * weight
+            recommendations[user_id] = {
+                "best_path": paths.path(best_path_id),
+                "num_paths": num_paths,
+                "best_path_score": best_score,
+                "final_score": best_score * math.log(1 + num_paths)
+            }
+        return recommendations
 
-        # Calculate recommendation scores
+    def explore_random_walks(self, max_hops, num_walks, time_budget=None, seed=0):
+        """
+        Approximate recommendations from weighted random walks of up to max_hops + 1 steps from the root.
+        The work is num_walks * (max_hops + 1) steps plus one find_neighbors per distinct (user, hop) reached,
+        instead of expanding every user within max_hops.
+        Each step picks one of find_neighbors(current, hop) with probability proportional to
+        EDGE_WEIGHTS[relation] * similarity, the same factors a path's weight is made of, so heavy paths are
+        sampled most. A walk stops at a user it already passed through, like the BFS never expands a user twice.
+
+        For each candidate: best_path is the heaviest path sampled, visits counts every time a walk reached it
+        and num_paths estimates the BFS's count (see estimate_num_paths), which final_score is built from.
+        More walks give better estimates; time_budget (seconds) stops early for a bounded latency.
+        With the same seed and no time cutoff the result is always the same.
+        """
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        root_id = self.root_user.user_id
+        similarities = self.similarity_table()
+        paths = PathStore(root_id)
+        weights = [1.0] # path weight for each path ID
+        transitions = {} # (user_id, hop) -> (neighbors, similarities, edge type weights, cumulative step weights)
+        best = {} # candidate_id -> [best path weight, best path ID, visits]
+        expanded = {} # user_id -> [lowest hop a walk stepped out of it at, number of walks that did]
+
+        walks = 0
+        while walks < num_walks:
+            if deadline is not None and walks % 64 == 0 and time.perf_counter() >= deadline:
+                break
+            walks += 1
+            current_id, path_id = root_id, 0
+            on_walk = {root_id}
+            for hop in range(max_hops + 1):
+                step = transitions.get((current_id, hop))
+                if step is None:
+                    step = transitions[(current_id, hop)] = self.walk_transitions(current_id, hop, similarities)
+                neighbors, edge_similarity, edge_type_weight, cumulative = step
+                entry = expanded.get(current_id)
+                if entry is None:
+                    expanded[current_id] = [hop, 1]
+                else:
+                    entry[0] = min(entry[0], hop)
+                    entry[1] += 1
+                if not neighbors or cumulative[-1] <= 0:
+                    break
+                k = rng.choices(range(len(neighbors)), cum_weights=cumulative)[0]
+                relation, neighbor_id = neighbors[k]
+
+                new_path_id, is_new = paths.extend(path_id, relation, neighbor_id)
+                if is_new:
+                    weights.append(weights[path_id] * edge_similarity[k] * edge_type_weight[k])
+                if neighbor_id != root_id and neighbor_id not in self.root_user.following:
+                    entry = best.get(neighbor_id)
+                    if entry is None:
+                        best[neighbor_id] = [weights[new_path_id], new_path_id, 1]
+                    else:
+                        entry[2] += 1
+                        if is_new and weights[new_path_id] > entry[0]:
+                            entry[0] = weights[new_path_id]
+                            entry[1] = new_path_id
+
+                if neighbor_id in on_walk:
+                    break
+                on_walk.add(neighbor_id)
+                current_id, path_id = neighbor_id, new_path_id
+
+        self.visited = {user_id for user_id, _ in transitions}
+        if self.stats is not None:
+            self.stats.paths += len(paths) - 1
+            self.stats.candidates += len(best)
+            self.stats.similarity_evaluations += similarities.evaluations
+
+        estimated_paths = self.estimate_num_paths(expanded, transitions, walks, best)
         recommendations = {}
-        print("Calculating recommendation scores...")
-        for user_id, paths in all_paths.items():
-            path_scores = [path_weight(p) for p in paths]
+        for user_id, (weight, best_path_id, visits) in best.items():
+            best_score = weight * weight
+            num_paths = max(1, round(estimated_paths.get(user_id, 0.0)))
+            recommendations[user_id] = {
+                "best_path": paths.path(best_path_id),
+                "num_paths": num_paths,
+                "best_path_score": best_score,
+                "final_score": best_score * math.log(1 + num_paths),
+                "visits": visits
+            }
+        return recommendations
+
+    def estimate_num_paths(self, expanded, transitions, walks, candidates):
+        """
+        Estimate the BFS's num_paths for each candidate from the walks.
+        The BFS adds one path to a candidate for every user it expands that has the candidate as a neighbor.
+        The walks know the neighbors of every user they stepped out of, so each of those users counts once for
+        each of its neighbors, weighted by 1 / (chance that any of the walks reaches it), with that chance
+        estimated from the share of walks that did: 1 - (1 - count / walks) ** walks (Horvitz-Thompson).
+        Users many walks pass through count about once, users reached by one walk stand in for the similar
+        users no walk reached. Neighbors are taken at the lowest hop a walk expanded the user at, the closest
+        to the hop the BFS expands it at.
+        """
+        estimated = {}
+        for user_id, (hop, count) in expanded.items():
+            weight = 1 / (1 - (1 - count / walks) ** walks)
+            for _, neighbor_id in transitions[(user_id, hop)][0]:
+                if neighbor_id in candidates:
+                    estimated[neighbor_id] = estimated.get(neighbor_id, 0.0) + weight
+        return estimated
+
+    def walk_transitions(self, current_id, hop, similarities):
+        """ The neighbors a walk can step to from current_id at hop, with their similarities, edge type weights and cumulative step weights """
+        neighbors = self.find_neighbors(current_id, hop)
+        if not neighbors:
+            return [], [], [], []
+        edge_similarity = similarities.compute_many([current_id] * len(neighbors), [n for _, n in neighbors]).tolist()
+        edge_type_weight = [EDGE_WEIGHTS.get(relation, 1.0) for relation, _ in neighbors]
+        cumulative = []
+        total = 0.0
+        for similarity, type_weight in zip(edge_similarity, edge_type_weight):
+            total += similarity * type_weight
+            cumulative.append(total)
+        return neighbors, edge_similarity, edge_type_weight, cumulative
+
+    @contextmanager
+    def pinned_root(self):
+        """
+        With a UserCache, keep the root user pinned while a BFS runs and unpin the frontier afterwards.
+        Does nothing for a plain dict.
+        """
+        if not isinstance(self.users, UserCache):
+            yield
+            return
+        self.users.pin([self.root_user.user_id])
+        try:
+            yield
+        finally:
+            self.users.unpin(self.pinned_frontier + [self.root_user.user_id])
+            self.pinned_frontier = []
+
+    def pin_frontier(self, current_id, queue):
+        """ Pin the users of the hop level that is about to be expanded, unpinning the previous level """
+        if not isinstance(self.users, UserCache):
+            return
+        # called when the first user of a level is popped, so the queue holds exactly the rest of that level
+        frontier = [current_id] + [user_id for user_id, _, _ in queue]
+        self.users.pin(frontier)
+        self.users.unpin(self.pinned_frontier)
+        self.pinned_frontier = frontier
+
+    def find_neighbors(self, current_id, hop):
+        """
+        Classify the connections of current_id as mutual, follower or following,
+        limited by the MAX_* caps which shrink with each hop.
+        """
+        user_data = self.load_user(current_id)
+        mutual_followers, mutual_following = self.mutual_connections(current_id, user_data)
+
+        neighbors = []
+        mutuals_found = 0
+        followers_found = 0
+        following_found = 0
+        truncated = [0, 0, 0] # mutual, follower, following neighbors dropped by the caps
+
+        # Followers → inbound relation
+        for f in user_data.followers:
+            if f in mutual_followers:
+                if mutuals_found < MAX_MUTUALS / (hop + 1): # limit mutuals
+                    mutuals_found += 1
+                    neighbors.append(("mutual", f))   # both follow each other
+                else:
+                    truncated[0] += 1
+            else:
+                if followers_found < MAX_FOLLOWERS / (hop + 1): # limit followers
+                    followers_found += 1
+                    neighbors.append(("follower", f))
+                else:
+                    truncated[1] += 1
+
+        # Following → outbound relation
+        for f in user_data.following:
+            if f in mutual_following:
+                pass
+                # neighbors.append(("mutual", f))
+            else:
+                if following_found < MAX_FOLLOWING / (hop + 1): # limit following
+                    following_found += 1
+                    neighbors.append(("following", f))
+                else:
+                    truncated[2] += 1
+
+        if self.stats is not None:
+            edges = len(user_data.followers) + len(user_data.following)
+            self.stats.record_expand(current_id, hop, edges, len(neighbors), truncated)
+        return neighbors
+
+    def mutual_connections(self, current_id, user_data):
+        """
+        (followers that current_id follows back, following that follow current_id back).
+        Read from the store's edge type index when there is one, so the neighbors don't have to be loaded,
+        otherwise every neighbor is loaded and checked.
+        """
+        if self.store is not None and self.store.has_edge_types and current_id not in self.changed_users:
+            return set(self.store.mutual_followers_of(current_id).tolist()), set(self.store.mutual_following_of(current_id).tolist())
 
-            best_score = max(path_scores)
-            num_paths = len(paths)
+        if self.prefetcher is not None:
+            self.prefetch_connections(current_id) # overlap the reads of the reciprocity checks below
+        mutual_followers = {f for f in user_data.followers if current_id in self.load_user(f).followers}
+        mutual_following = {f for f in user_data.following if current_id in self.load_user(f).following}
+        return mutual_followers, mutual_following
+
+    def score_paths(self, paths, all_paths, keep_paths=False, similarities=None):
+        """
+        Score every candidate from its paths.
+        Each path ID is one edge (its prefix's last user -> its last user), so the similarity of every
+        distinct edge is computed in one vectorized call and a path's weight is its prefix's weight
+        times its last edge, filled in one hop level at a time.
+        """
+        if similarities is None:
+            similarities = self.similarity_table()
+
+        parents = np.frombuffer(paths.parents, dtype=np.int64)
+        nodes = np.frombuffer(paths.nodes, dtype=np.int64)
+        hops = np.frombuffer(paths.hops, dtype=np.int64)
+        relations = np.frombuffer(paths.relations, dtype=np.int8)
+
+        edge_similarity = np.ones(len(paths), dtype=np.float64)
+        if len(paths) > 1:
+            edge_similarity[1:] = similarities.compute_many(nodes[parents[1:]], nodes[1:]) ## similarity weights
+            if self.stats is not None:
+                self.stats.similarity_evaluations += similarities.evaluations
+        edge_type_weight = np.array([EDGE_WEIGHTS.get(r, 1.0) for r in RELATIONS])[relations] # edge type weights
+
+        weights = np.ones(len(paths), dtype=np.float64)
+        order = np.argsort(hops, kind="stable")
+        level_bounds = np.searchsorted(hops[order], np.arange(1, hops.max() + 2))
+        for start, end in zip(level_bounds[:-1], level_bounds[1:]):
+            level = order[start:end]
+            weights[level] = weights[parents[level]] * edge_similarity[level] * edge_type_weight[level]
+
+        recommendations = {}
+        for user_id, path_ids in all_paths.items():
+            path_weights = weights[path_ids]
+            best_path_id = path_ids[int(np.argmax(path_weights))]
+            best_score = float(weights[best_path_id] * weights[best_path_id]) # favor stronger connections more heavily
+            num_paths = len(path_ids)
 
             final_score = best_score * math.log(1 + num_paths)
 
             recommendations[user_id] = {
-                "paths": paths,
-                "best_path": paths[path_scores.index(best_score)],
+                "best_path": paths.path(best_path_id),
                 "num_paths": num_paths,
                 "best_path_score": best_score,
                 "final_score": final_score
             }
+            if keep_paths:
+                recommendations[user_id]["paths"] = [paths.path(path_id) for path_id in path_ids]
+
+        return recommendations
 
-        # Sort final output
-        sorted_recommendations = dict(
+    def similarity_table(self):
+        """ A fresh memoized edge similarity table over this recommender's attribute matrix """
+        return SimilarityTable(self.attributes, lambda user_id: self.load_user(user_id).attributes)
+
+    def rank_recommendations(self, recommendations):
+        """ Sort recommendations by final score, highest first """
+        return dict(
             sorted(
                 recommendations.items(),
                 key=lambda x: x[1]["final_score"],
@@ -153,8 +575,6 @@ class Recommender:
             )
         )
 
-        return sorted_recommendations
-
     
     def custom_similarity(self, a, b):
         """
@@ -181,6 +601,8 @@ class Recommender:
         """
         follower = self.load_user(follower_id)
         user = self.load_user(user_id)
+        if self.stats is not None:
+            self.stats.similarity_evaluations += 1
 
         # Similarity in [0,1]
         similarity = self.custom_similarity(user.attributes, follower.attributes)
@@ -213,7 +635,8 @@ def save_best_paths_to_json(recommendations, filename="best_paths.json"):
 
 if __name__ == "__main__":
     random.seed(0)  # For reproducibility
-    recommender = Recommender(root_user=ROOT_USER_ID, folder=DATA_USERS_FOLDER)
+    store = GraphStore(DATA_GRAPH_FOLDER) if GraphStore.exists(DATA_GRAPH_FOLDER) else None
+    recommender = Recommender(root_user=ROOT_USER_ID, folder=DATA_USERS_FOLDER, store=store)
     potential_recommendations = recommender.create_recommendation_set(max_hops=3)
     ## print total amount of recommendations
     print(f"Total recommendations found: {len(potential_recommendations)}")
@@ -0,0 +1,227 @@
+import os
+import json
+import struct
+import numpy as np
+from models.path_store import RELATIONS, RELATION_CODES
+
+'''
+Bulk output for recommendation results. Many roots are appended to one file, one block per root,
+and a sidecar index (<file>.idx) records (root, byte offset, byte length) for every block as raw int64
+triples, so a reader can seek straight to one root without parsing the rest of the file.
+The index starts with a 16 byte header, the magic b"RESULTS1" and the block format name padded with
+zero bytes to 8, so readers detect the format and appends can't mix formats in one file.
+
+Two block formats hold the same rows as batch_recommender.recommendation_rows:
+    "jsonl"   one JSON line {"root", "recommendations": [rows]}
+    "binary"  a columnar block, little-endian:
+                  header          root, num_candidates n, num_path_entries m   (3 x int64)
+                  candidates      n x int32
+                  final_score     n x float64
+                  best_path_score n x float64
+                  num_paths       n x int32
+                  path_offsets    (n + 1) x int64, candidate k's best path is entries offsets[k]:offsets[k+1]
+                  path_users      m x int32
+                  path_relations  m x int8, codes from models.path_store.RELATIONS
+'''
+
+JSONL = "jsonl"
+BINARY = "binary"
+FORMATS = (JSONL, BINARY)
+
+_HEADER = struct.Struct("<qqq")
+_INDEX_MAGIC = b"RESULTS1"
+_INDEX_HEADER = struct.Struct("<8s8s")
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def read_format(path):
+    ''' The block format recorded in path's index, None for an empty or missing index '''
+    try:
+        with open(index_path(path), "rb") as f:
+            header = f.read(_INDEX_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if not header:
+        return None
+    if len(header) < _INDEX_HEADER.size:
+        raise ValueError(f"{index_path(path)} is not a result index")
+    magic, format = _INDEX_HEADER.unpack(header)
+    format = format.rstrip(b"\0").decode("ascii", "replace")
+    if magic != _INDEX_MAGIC or format not in FORMATS:
+        raise ValueError(f"{index_path(path)} is not a result index")
+    return format
+
+
+def encode_jsonl(root, rows):
+    return (json.dumps({"root": root, "recommendations": rows}) + "\n").encode("utf-8")
+
+
+def decode_jsonl(data):
+    block = json.loads(data)
+    rows = block["recommendations"]
+    for row in rows:
+        row["best_path"] = [tuple(step) for step in row["best_path"]]
+    return block["root"], rows
+
+
+def encode_binary(root, rows):
+    n = len(rows)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(row["best_path"]) for row in rows])
+    m = int(offsets[-1])
+    steps = [step for row in rows for step in row["best_path"]]
+    return b"".join([
+        _HEADER.pack(root, n, m),
+        np.fromiter((row["user_id"] for row in rows), dtype="<i4", count=n).tobytes(),
+        np.fromiter((row["final_score"] for row in rows), dtype="<f8", count=n).tobytes(),
+        np.fromiter((row["best_path_score"] for row in rows), dtype="<f8", count=n).tobytes(),
+        np.fromiter((row["num_paths"] for row in rows), dtype="<i4", count=n).tobytes(),
+        offsets.astype("<i8").tobytes(),
+        np.fromiter((user_id for _, user_id in steps), dtype="<i4", count=m).tobytes(),
+        np.fromiter((RELATION_CODES[relation] for relation, _ in steps), dtype="i1", count=m).tobytes()
+    ])
+
+
+def decode_binary_columns(data):
+    ''' The columns of one binary block as numpy arrays (no per-row Python objects) '''
+    root, n, m = _HEADER.unpack_from(data, 0)
+    columns = {"root": root}
+    position = _HEADER.size
+    for name, dtype, count in (("candidates", "<i4", n), ("final_score", "<f8", n), ("best_path_score", "<f8", n),
+                               ("num_paths", "<i4", n), ("path_offsets", "<i8", n + 1),
+                               ("path_users", "<i4", m), ("path_relations", "i1", m)):
+        columns[name] = np.frombuffer(data, dtype=dtype, count=count, offset=position)
+        position += columns[name].nbytes
+    return columns
+
+
+def decode_binary(data):
+    columns = decode_binary_columns(data)
+    offsets = columns["path_offsets"].tolist()
+    users = columns["path_users"].tolist()
+    relations = columns["path_relations"].tolist()
+    rows = []
+    for k, (user_id, final_score, best_path_score, num_paths) in enumerate(zip(
+            columns["candidates"].tolist(), columns["final_score"].tolist(),
+            columns["best_path_score"].tolist(), columns["num_paths"].tolist())):
+        rows.append({
+            "user_id": user_id,
+            "final_score": final_score,
+            "best_path_score": best_path_score,
+            "num_paths": num_paths,
+            "best_path": [(RELATIONS[relations[i]], users[i]) for i in range(offsets[k], offsets[k + 1])]
+        })
+    return columns["root"], rows
+
+
+ENCODERS = {JSONL: encode_jsonl, BINARY: encode_binary}
+DECODERS = {JSONL: decode_jsonl, BINARY: decode_binary}
+
+
+class ResultWriter:
+    ''' Appends one block per root to path and its (root, offset, length) to the sidecar index.
+        Blocks can be encoded elsewhere (e.g. in worker processes) with ENCODERS[format] and passed to write_block.
+        format=None writes JSONL, or keeps the existing file's format when appending; appending in a
+        different format than the file was written in raises ValueError. '''
+
+    def __init__(self, path, format=None, append=False):
+        existing = read_format(path) if append else None
+        format = format or existing or JSONL
+        if format not in FORMATS:
+            raise ValueError(f"Unknown result format: {format}")
+        if existing is not None and existing != format:
+            raise ValueError(f"{path} holds {existing} results, can't append {format}")
+        self.path = path
+        self.format = format
+        self.encode = ENCODERS[format]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mode = "ab" if append else "wb"
+        self.file = open(path, mode)
+        self.index = open(index_path(path), mode)
+        if self.index.seek(0, os.SEEK_END) == 0:
+            self.index.write(_INDEX_HEADER.pack(_INDEX_MAGIC, format.encode("ascii")))
+        self.offset = self.file.seek(0, os.SEEK_END)
+        self.count = 0
+
+    def write(self, root, rows):
+        self.write_block(root, self.encode(root, rows))
+
+    def write_block(self, root, data):
+        self.file.write(data)
+        self.index.write(struct.pack("<qqq", root, self.offset, len(data)))
+        self.offset += len(data)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+''' End of ResultWriter class '''
+
+
+class ResultReader:
+    ''' Reads results written by ResultWriter. read(root) seeks to that root's block through the index
+        and decodes only that block; if a root was written more than once the last block wins.
+        The format is read from the index; passing a different one raises ValueError. '''
+
+    def __init__(self, path, format=None):
+        recorded = read_format(path)
+        if recorded is None:
+            raise ValueError(f"{index_path(path)} is empty or missing")
+        if format is not None and format != recorded:
+            raise ValueError(f"{path} holds {recorded} results, not {format}")
+        self.path = path
+        self.format = recorded
+        self.decode = DECODERS[recorded]
+        entries = np.fromfile(index_path(path), dtype="<i8", offset=_INDEX_HEADER.size).reshape(-1, 3)
+        self.blocks = {root: (offset, length) for root, offset, length in entries.tolist()}
+        self.file = open(path, "rb")
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, root):
+        return root in self.blocks
+
+    def roots(self):
+        return list(self.blocks)
+
+    def read_block(self, root):
+        offset, length = self.blocks[root]
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def read(self, root):
+        ''' Rows for one root in ranked order, raises KeyError for a root that isn't in the file '''
+        return self.decode(self.read_block(root))[1]
+
+    def read_columns(self, root):
+        ''' A binary root's columns as numpy arrays, see decode_binary_columns '''
+        if self.format != BINARY:
+            raise ValueError("read_columns needs the binary format")
+        return decode_binary_columns(self.read_block(root))
+
+    def __iter__(self):
+        ''' (root, rows) for every root in the order they were first written '''
+        for root in self.blocks:
+            yield root, self.read(root)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+''' End of ResultReader class '''
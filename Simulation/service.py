@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from models.graph_store import GraphStore
+from models.user_cache import UserCache
+from models.edge_overlay import EdgeOverlay
+from models.user import User
+from recommender import Recommender, DATA_USERS_FOLDER, DATA_GRAPH_FOLDER
+from batch_recommender import recommendation_rows
+from incremental import FollowEvent, FOLLOW, UNFOLLOW
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8000
+
+
+class ReadWriteLock:
+    ''' Many readers or one writer. Queries read the graph, follow/unfollow events write it.
+        A waiting writer stops new readers from starting, so a steady stream of queries can't starve events. '''
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writing or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writing = True
+
+    def release_write(self):
+        with self.condition:
+            self.writing = False
+            self.condition.notify_all()
+
+''' End of ReadWriteLock class '''
+
+
+class ResultCache:
+    ''' TTL + LRU cache of recommendation results keyed by (root_user, max_hops, alpha, top_k).
+        Each entry remembers the users its BFS expanded, so an edge change between a and b
+        only invalidates the entries that expanded a or b (the same rule as IncrementalRecommender). '''
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict() # key -> (expires_at, result, visited)
+        self.keys_by_user = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result, visited):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, result, visited)
+            for user_id in visited:
+                self.keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate_users(self, user_ids):
+        ''' Drop every entry whose BFS expanded one of user_ids, returns how many were dropped '''
+        with self.lock:
+            keys = set()
+            for user_id in user_ids:
+                keys |= self.keys_by_user.get(user_id, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key):
+        _, _, visited = self.entries.pop(key)
+        for user_id in visited:
+            keys = self.keys_by_user.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_user[user_id]
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+''' End of ResultCache class '''
+
+
+class RecommendationService:
+    '''
+    Keeps the graph warm between requests: one graph store (or JSON folder), one shared UserCache
+    and one ResultCache. Queries run concurrently; follow/unfollow events take the write lock,
+    record the changed edges and invalidate the affected results.
+
+    Events are kept as edge deltas in an EdgeOverlay that is applied to every user as it is loaded,
+    and the changed users are dropped from the user cache, so the cache stays bounded by max_users
+    and a changed user can be evicted and reloaded without losing the change. The overlay holds one
+    entry per changed edge. Without a graph store, once it holds more than max_overlay_edges the
+    changed users are written back to their JSON files and it starts empty again; a graph store is
+    read only, so its overlay lasts until the store is rebuilt from the files.
+    '''
+
+    def __init__(self, folder=DATA_USERS_FOLDER, graph_folder=DATA_GRAPH_FOLDER, max_users=None,
+                 max_results=10000, result_ttl=300.0, prefetch_workers=0, max_overlay_edges=100000):
+        self.folder = folder
+        self.store = GraphStore(graph_folder) if GraphStore.exists(graph_folder) else None
+        self.users = UserCache(max_entries=max_users)
+        self.results = ResultCache(max_entries=max_results, ttl=result_ttl)
+        self.prefetch_workers = prefetch_workers
+        self.lock = ReadWriteLock()
+        self.pending = {} # key -> threading.Event, so concurrent misses on one key compute it once
+        self.pending_lock = threading.Lock()
+        self.overlay = EdgeOverlay()
+        self.max_overlay_edges = max_overlay_edges
+
+    def recommend(self, root_user, max_hops=3, alpha=0.8, top_k=None):
+        ''' Returns (rows, cached) '''
+        key = (root_user, max_hops, alpha, top_k)
+        self.lock.acquire_read()
+        try:
+            while True:
+                rows = self.results.get(key)
+                if rows is not None:
+                    return rows, True
+                with self.pending_lock:
+                    done = self.pending.get(key)
+                    if done is None:
+                        done = self.pending[key] = threading.Event()
+                        break
+                done.wait() # another request is computing this key, then read its result
+            try:
+                rows, visited = self.compute(root_user, max_hops, alpha, top_k)
+                self.results.put(key, rows, visited)
+                return rows, False
+            finally:
+                with self.pending_lock:
+                    del self.pending[key]
+                done.set()
+        finally:
+            self.lock.release_read()
+
+    def compute(self, root_user, max_hops, alpha, top_k):
+        ''' Returns (rows, users the BFS expanded) '''
+        recommender = Recommender(root_user, folder=self.folder, store=self.store, users=self.users,
+                                  prefetch_workers=self.prefetch_workers, changed_users=self.overlay, overlay=self.overlay)
+        try:
+            recommendations = recommender.create_recommendation_set(max_hops=max_hops, alpha=alpha, top_k=top_k, verbose=False)
+        finally:
+            recommender.close()
+        return recommendation_rows(recommendations), recommender.visited | {root_user}
+
+    def apply_events(self, events):
+        ''' Apply follow/unfollow events, returns the number of cached results invalidated.
+            Every event is checked before anything changes, so a batch with an unknown user or kind changes nothing. '''
+        for event in events:
+            if event.kind not in (FOLLOW, UNFOLLOW):
+                raise ValueError(f"Unknown event kind: {event.kind}")
+            for user_id in (event.follower_id, event.followee_id):
+                if not self.user_exists(user_id):
+                    raise KeyError(user_id)
+
+        self.lock.acquire_write()
+        try:
+            changed = set()
+            for event in events:
+                if event.kind == FOLLOW:
+                    self.overlay.follow(event.follower_id, event.followee_id)
+                else:
+                    self.overlay.unfollow(event.follower_id, event.followee_id)
+                changed.update((event.follower_id, event.followee_id))
+            for user_id in changed:
+                self.users.discard(user_id) # reloaded with the overlay applied when next needed
+            invalidated = self.results.invalidate_users(changed)
+            if self.store is None and self.overlay.size > self.max_overlay_edges:
+                self.flush()
+            return invalidated
+        finally:
+            self.lock.release_write()
+
+    def user_exists(self, user_id):
+        if self.store is not None:
+            return user_id in self.store
+        return os.path.exists(os.path.join(self.folder, f"user_{user_id}.json"))
+
+    def flush(self):
+        ''' Write the users changed by events back to their JSON files and empty the overlay.
+            Called with the write lock held. Cached users already have the overlay applied, so they stay valid. '''
+        if self.store is not None:
+            raise ValueError("A graph store is read only, rebuild it from the JSON files instead")
+        for user_id in self.overlay.users():
+            data = self.overlay.apply(User.load_user_data(user_id, folder=self.folder))
+            with open(os.path.join(self.folder, f"user_{user_id}.json"), "w") as f:
+                json.dump(data, f, indent=4)
+        self.overlay.clear()
+
+    def stats(self):
+        return {"users": self.users.stats(), "results": self.results.stats(), "overlay": self.overlay.stats()}
+
+''' End of RecommendationService class '''
+
+
+def parse_user_id(value):
+    ''' A user ID from a JSON event: an integer, or a string holding one '''
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"user IDs must be integers, got {value!r}")
+    return int(value)
+
+
+def parse_event(event):
+    ''' A FollowEvent from one JSON event, with integer user IDs so they match the stored ones '''
+    event = FollowEvent(**event)
+    return event._replace(follower_id=parse_user_id(event.follower_id), followee_id=parse_user_id(event.followee_id))
+
+
+def make_handler(service):
+    class RecommendationHandler(BaseHTTPRequestHandler):
+        ''' GET /recommend?root=1&max_hops=3&alpha=0.8&top_k=20, POST /events, GET /stats '''
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                return self.send_json(200, service.stats())
+            if url.path != "/recommend":
+                return self.send_json(404, {"error": "not found"})
+            query = parse_qs(url.query)
+            try:
+                root = int(query["root"][0])
+                max_hops = int(query.get("max_hops", [3])[0])
+                alpha = float(query.get("alpha", [0.8])[0])
+                top_k = int(query["top_k"][0]) if "top_k" in query else None
+            except (KeyError, ValueError):
+                return self.send_json(400, {"error": "expected root, and optionally max_hops, alpha, top_k"})
+            try:
+                rows, cached = service.recommend(root, max_hops=max_hops, alpha=alpha, top_k=top_k)
+            except ValueError as e:
+                return self.send_json(400, {"error": str(e)})
+            except (FileNotFoundError, KeyError):
+                return self.send_json(404, {"error": f"unknown user {root}"})
+            self.send_json(200, {"root": root, "cached": cached, "recommendations": rows})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/events":
+                return self.send_json(404, {"error": "not found"})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                events = [parse_event(event) for event in body]
+                invalidated = service.apply_events(events)
+            except (ValueError, TypeError) as e:
+                return self.send_json(400, {"error": str(e)})
+            except (FileNotFoundError, KeyError) as e:
+                return self.send_json(404, {"error": f"unknown user {e}"})
+            self.send_json(200, {"applied": len(events), "invalidated": invalidated})
+
+        def send_json(self, status, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # keep the console quiet, one line per request is too much under load
+
+    return RecommendationHandler
+
+
+def serve(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving recommendations on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident recommendation service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--max-users", type=int, default=None, help="user cache entry limit")
+    parser.add_argument("--ttl", type=float, default=300.0, help="seconds a cached result stays valid")
+    parser.add_argument("--prefetch-workers", type=int, default=0)
+    parser.add_argument("--max-overlay-edges", type=int, default=100000,
+                        help="changed edges held before they are written back to the JSON files (no graph store)")
+    args = parser.parse_args()
+
+    serve(RecommendationService(folder=DATA_USERS_FOLDER, graph_folder=DATA_GRAPH_FOLDER, max_users=args.max_users,
+                                result_ttl=args.ttl, prefetch_workers=args.prefetch_workers,
+                                max_overlay_edges=args.max_overlay_edges),
+          host=args.host, port=args.port)
@@ -0,0 +1,226 @@
+import numpy as np
+import scipy.sparse as sp
+from models.graph_store import GraphStore, reciprocal_edges
+from models.path_store import RELATIONS, RELATION_CODES
+from models.attribute_matrix import similarity_many
+from recommender import EDGE_WEIGHTS, DATA_GRAPH_FOLDER
+
+class SparseRecommender:
+    '''
+    Recommendations for many roots at once from sparse matrix products, for low max_hops.
+
+    The BFS neighbor graph (followers as "mutual" or "follower", one-way following as "following") is held
+    as one CSR matrix whose entries are similarity * EDGE_WEIGHTS[relation], with a parallel relation code
+    per entry. For a block of roots the BFS runs one hop level at a time on all of them:
+        counts   frontier @ adjacency gives the number of new paths to every user (the BFS's num_paths)
+        best     a max-times product (gather each frontier user's row, reduce by max) gives the heaviest path
+        frontier users reached for the first time become the next level
+    Candidates exclude the root and the users it already follows, like Recommender.
+
+    Differences from Recommender.create_recommendation_set:
+        - no MAX_* caps, so results match only while no user has more neighbors than the caps allow
+        - a user is expanded with its heaviest path on its first level instead of the first path the BFS
+          found, so best_path_score is never lower; num_paths is the same
+    '''
+
+    def __init__(self, store, block_size=256, chunk_size=1 << 22):
+        self.store = store
+        self.n = store.num_users
+        self.block_size = block_size # roots per batch of products, bounds the memory of one level
+        n = self.n
+
+        if store.has_edge_types:
+            followers_mutual, following_mutual = store.followers_mutual, store.following_mutual
+        else:
+            followers_mutual = reciprocal_edges(store.followers_offsets, store.followers)
+            following_mutual = reciprocal_edges(store.following_offsets, store.following)
+        followers_mutual = np.asarray(followers_mutual).astype(bool)
+        one_way = ~np.asarray(following_mutual).astype(bool)
+
+        # every edge the BFS can take from a user: its followers, and the users it follows that don't follow back
+        src = np.concatenate([
+            np.repeat(np.arange(n, dtype=np.int64), np.diff(store.followers_offsets)),
+            np.repeat(np.arange(n, dtype=np.int64), np.diff(store.following_offsets))[one_way]])
+        dst = np.concatenate([
+            np.asarray(store.followers, dtype=np.int64),
+            np.asarray(store.following, dtype=np.int64)[one_way]])
+        codes = np.concatenate([
+            np.where(followers_mutual, RELATION_CODES["mutual"], RELATION_CODES["follower"]).astype(np.int8),
+            np.full(int(one_way.sum()), RELATION_CODES["following"], dtype=np.int8)])
+
+        order = np.argsort(src * n + dst, kind="stable")
+        src, dst, codes = src[order], dst[order], codes[order]
+
+        weights = np.empty(len(src), dtype=np.float64)
+        edge_weights = np.array([EDGE_WEIGHTS.get(r, 1.0) for r in RELATIONS])
+        for start in range(0, len(src), chunk_size):
+            stop = min(start + chunk_size, len(src))
+            weights[start:stop] = similarity_many(store.attributes[src[start:stop]], store.attributes[dst[start:stop]]) \
+                * edge_weights[codes[start:stop]]
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        self.weights = sp.csr_matrix((weights, dst, indptr), shape=(n, n)) # similarity and edge weight folded in
+        self.relations = codes # relation code for each entry of self.weights
+        self.adjacency = sp.csr_matrix((np.ones(len(dst), dtype=np.int64), dst, indptr), shape=(n, n))
+
+    @staticmethod
+    def from_folder(graph_folder=DATA_GRAPH_FOLDER, block_size=256):
+        return SparseRecommender(GraphStore(graph_folder), block_size=block_size)
+
+    def relation_matrix(self, relation):
+        ''' The weighted matrix of one relation type ("mutual", "follower" or "following") '''
+        mask = (self.relations == RELATION_CODES[relation]).astype(np.float64)
+        matrix = sp.csr_matrix((self.weights.data * mask, self.weights.indices, self.weights.indptr),
+                               shape=self.weights.shape, copy=True) # eliminate_zeros works in place
+        matrix.eliminate_zeros()
+        return matrix
+
+    def recommend(self, root_id, max_hops=2, top_k=None):
+        return self.recommend_many([root_id], max_hops=max_hops, top_k=top_k)[root_id]
+
+    def recommend_many(self, root_ids, max_hops=2, top_k=None):
+        ''' {root_id: recommendations} in the same shape as Recommender.create_recommendation_set, ranked by final_score '''
+        if top_k is not None and top_k < 1:
+            raise ValueError(f"top_k must be at least 1, got {top_k}")
+        root_ids = list(root_ids)
+        results = {}
+        for start in range(0, len(root_ids), self.block_size):
+            block = np.array(root_ids[start:start + self.block_size], dtype=np.int64)
+            results.update(self._recommend_block(block, max_hops, top_k))
+        return results
+
+    def _recommend_block(self, roots, max_hops, top_k):
+        n, b = self.n, len(roots)
+        rows = np.arange(b, dtype=np.int64)
+        frontier = sp.csr_matrix((np.ones(b, dtype=np.int64), (rows, roots)), shape=(b, n))
+        reached = frontier.astype(bool)
+        frontier_keys = rows * n + roots # (block row, user) keys of the frontier, sorted
+        frontier_weights = np.ones(b, dtype=np.float64)
+        counts = sp.csr_matrix((b, n), dtype=np.int64)
+        levels = [] # per level: sorted keys reached, best weight, parent user, relation code
+
+        for hop in range(max_hops + 1):
+            step = frontier @ self.adjacency # paths added by expanding this level
+            counts = counts + step
+            keys, weights, parents, codes = self._max_times(frontier_keys, frontier_weights)
+            levels.append((keys, weights, parents, codes))
+            if hop == max_hops:
+                break
+
+            new = step.astype(bool) > reached
+            new.sort_indices()
+            reached = reached + new
+            new = new.tocoo()
+            frontier_keys = np.sort(new.row.astype(np.int64) * n + new.col)
+            frontier_weights = weights[np.searchsorted(keys, frontier_keys)]
+            frontier = sp.csr_matrix((np.ones(len(frontier_keys), dtype=np.int64),
+                                      (frontier_keys // n, frontier_keys % n)), shape=(b, n))
+
+        return self._build_results(roots, levels, counts.tocsr(), top_k)
+
+    def _max_times(self, keys, weights):
+        ''' For every (root, user) reached from the frontier: the heaviest path weight, its parent and relation '''
+        n = self.n
+        users = keys % n
+        starts, ends = self.weights.indptr[users], self.weights.indptr[users + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0, dtype=np.float64), empty, np.zeros(0, dtype=np.int8)
+
+        # entry positions of every frontier user's row, laid out back to back
+        edges = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        out_keys = np.repeat(keys // n, lengths) * n + self.weights.indices[edges]
+        out_weights = np.repeat(weights, lengths) * self.weights.data[edges]
+        out_parents = np.repeat(users, lengths)
+
+        order = np.argsort(out_keys) # equal weights may pick either parent, like ties between BFS paths
+        out_keys, out_weights, edges, out_parents = out_keys[order], out_weights[order], edges[order], out_parents[order]
+        group_starts, best, first = group_max(out_keys, out_weights)
+        return out_keys[group_starts], best, out_parents[first], self.relations[edges[first]]
+
+    def _build_results(self, roots, levels, counts, top_k):
+        n = self.n
+        # best over every level for each (root, candidate)
+        keys = np.concatenate([level[0] for level in levels])
+        weights = np.concatenate([level[1] for level in levels])
+        level_of = np.concatenate([np.full(len(level[0]), hop, dtype=np.int64) for hop, level in enumerate(levels)])
+        order = np.argsort(keys, kind="stable")
+        keys, weights, level_of = keys[order], weights[order], level_of[order]
+        group_starts, weights, first = group_max(keys, weights)
+        keys, level_of = keys[group_starts], level_of[first]
+
+        # drop each root and the users it already follows
+        excluded_keys = np.concatenate([row * n + np.append(np.asarray(self.store.following_of(root), dtype=np.int64), root)
+                                        for row, root in enumerate(roots.tolist())])
+        positions = np.minimum(np.searchsorted(keys, excluded_keys), max(len(keys) - 1, 0))
+        kept = np.ones(len(keys), dtype=bool)
+        if len(keys):
+            kept[positions[keys[positions] == excluded_keys]] = False
+        keys, weights, level_of = keys[kept], weights[kept], level_of[kept]
+        block_rows, candidates = keys // n, keys % n
+
+        counts.sort_indices()
+        counts = counts.tocoo() # row-major, so its keys come out sorted
+        count_keys = counts.row.astype(np.int64) * n + counts.col
+        num_paths = counts.data[np.searchsorted(count_keys, keys)]
+        best_scores = weights * weights
+        final_scores = best_scores * np.log1p(num_paths)
+
+        # rows in output order: by root, then by final score, best first
+        row_bounds = np.searchsorted(block_rows, np.arange(len(roots) + 1))
+        ranked = []
+        for lo, hi in zip(row_bounds[:-1].tolist(), row_bounds[1:].tolist()):
+            scores = -final_scores[lo:hi]
+            if top_k is not None and top_k < hi - lo:
+                top = np.argpartition(scores, top_k)[:top_k] # only the top_k need sorting
+                ranked.append(lo + top[np.argsort(scores[top], kind="stable")])
+            else:
+                ranked.append(lo + np.argsort(scores, kind="stable"))
+        order = np.concatenate(ranked) if ranked else np.zeros(0, dtype=np.int64)
+        paths = self._paths(levels, keys[order], level_of[order])
+
+        results = {root: {} for root in roots.tolist()}
+        for i, path in zip(order.tolist(), paths):
+            root = int(roots[block_rows[i]])
+            results[root][int(candidates[i])] = {
+                "best_path": [("root", root)] + path,
+                "num_paths": int(num_paths[i]),
+                "best_path_score": float(best_scores[i]),
+                "final_score": float(final_scores[i])
+            }
+        return results
+
+    def _paths(self, levels, keys, level_of):
+        ''' Best path of each (root, user) key as a list of (relation, user_id) after the root,
+            following the best parents back one level at a time for all keys of a level together '''
+        n = self.n
+        paths = [None] * len(keys)
+        for hop in range(len(levels)):
+            where = np.flatnonzero(level_of == hop)
+            current = keys[where]
+            steps = []
+            for h in range(hop, -1, -1):
+                level_keys, _, parents, codes = levels[h]
+                i = np.searchsorted(level_keys, current)
+                users = current % n
+                steps.append(list(zip([RELATIONS[code] for code in codes[i].tolist()], users.tolist())))
+                current = current - users + parents[i]
+            steps.reverse()
+            for k, path in zip(where.tolist(), zip(*steps)):
+                paths[k] = list(path)
+        return paths
+
+''' End of SparseRecommender class '''
+
+
+def group_max(keys, values):
+    ''' For sorted keys: (start of each run of equal keys, max value of the run, index of the run's first max) '''
+    group_starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    best = np.maximum.reduceat(values, group_starts)
+    group_of = np.repeat(np.arange(len(group_starts)), np.diff(np.r_[group_starts, len(keys)]))
+    hits = np.flatnonzero(values == best[group_of])
+    first = hits[np.r_[True, group_of[hits][1:] != group_of[hits][:-1]]]
+    return group_starts, best, first
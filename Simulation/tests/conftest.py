@@ -0,0 +1,26 @@
+import os
+import sys
+import random
+import pytest
+
+# the scripts import each other from the Simulation folder (from models.user import User), like running them from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.user_generator import UserGenerator
+from models.graph_store import convert_users_folder
+
+
+@pytest.fixture(scope="session")
+def graph(tmp_path_factory):
+    ''' A seeded 200 user graph as JSON files and as a graph store: (users folder, GraphStore) '''
+    folder = tmp_path_factory.mktemp("graph")
+    users_folder = str(folder / "users")
+    random.seed(0)
+    generator = UserGenerator()
+    generator.generate_users(num_users=200, num_attributes=5)
+    generator.generate_connections(avg_connections=3)
+    generator.add_friend_cliques(num_attributes=5, num_cliques=8, min_size=5, max_size=12, mutual_prob=0.8,
+                                 fail_prob=0.1, attribute_shift=0.9, attribute_shift_chance=0.8)
+    generator.save_users_individual(folder=users_folder)
+    store = convert_users_folder(users_folder=users_folder, graph_folder=str(folder / "store"))
+    return users_folder, store
@@ -0,0 +1,47 @@
+import json
+import pytest
+from recommender import Recommender
+import batch_recommender
+from batch_recommender import recommend_batch, recommendation_rows
+from result_io import ENCODERS, JSONL
+
+ROOTS = list(range(0, 200, 15))
+
+
+def read_batch(path):
+    with open(path) as f:
+        return {entry["root"]: entry["recommendations"] for entry in map(json.loads, f)}
+
+
+@pytest.mark.parametrize("use_store", (False, True))
+def test_batch_matches_serial_recommendations(graph, tmp_path, use_store):
+    users_folder, store = graph
+    graph_folder = store.folder if use_store else str(tmp_path / "no_store")
+    output_file = str(tmp_path / "batch.jsonl")
+    count = recommend_batch(ROOTS, output_file=output_file, workers=2, max_hops=2, top_n=5,
+                            graph_folder=graph_folder, users_folder=users_folder, chunksize=2, progress_every=0)
+    assert count == len(ROOTS)
+    results = read_batch(output_file)
+    assert sorted(results) == ROOTS
+    for root in ROOTS:
+        recommender = Recommender(root, folder=users_folder)
+        expected = recommendation_rows(recommender.create_recommendation_set(max_hops=2, verbose=False), top_n=5)
+        # through JSON, so paths come back as lists
+        assert results[root] == json.loads(json.dumps(expected))
+
+
+@pytest.mark.parametrize("top_n", (None, 3))
+def test_worker_reuses_its_users_between_roots(graph, top_n):
+    ''' One worker's roots share its user cache and give the same blocks as fresh recommenders '''
+    users_folder, store = graph
+    batch_recommender._init_worker(store.folder, users_folder, max_users=50)
+    try:
+        cache = batch_recommender._worker_users
+        for root in ROOTS:
+            root_id, block = batch_recommender._recommend_root((root, 2, 0.8, top_n, JSONL))
+            recommender = Recommender(root, folder=users_folder, store=store)
+            expected = recommendation_rows(recommender.create_recommendation_set(max_hops=2, verbose=False), top_n)
+            assert (root_id, block) == (root, ENCODERS[JSONL](root, expected))
+        assert cache.hits > 0 and len(cache) <= 50
+    finally:
+        batch_recommender._init_worker(None, users_folder)
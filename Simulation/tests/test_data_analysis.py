@@ -0,0 +1,56 @@
+from collections import Counter
+import pytest
+from data_analysis import load_all_users, compute_statistics, stream_statistics, GraphStatistics
+
+
+def expected_report(users):
+    ''' The numbers of GraphStatistics.report computed straight from every user dict '''
+    avg_followers, avg_mutuals, _, max_followers = compute_statistics(users)
+    return {
+        "total_users": len(users),
+        "avg_followers": avg_followers,
+        "avg_mutuals": avg_mutuals,
+        "max_followers": max_followers,
+        "top_user": users[min(u for u, d in users.items() if len(d["followers"]) == max_followers)]["name"],
+        "clique_coverage": sum(1 for d in users.values() if d["cliques"]) / len(users),
+        "num_cliques": len({c for d in users.values() for c in d["cliques"]}),
+        "follower_histogram": dict(sorted(Counter(len(d["followers"]) for d in users.values()).items())),
+        "following_histogram": dict(sorted(Counter(len(d["following"]) for d in users.values()).items())),
+    }
+
+
+@pytest.mark.parametrize("use_store", (False, True))
+def test_streamed_statistics_match_compute_statistics(graph, tmp_path, use_store):
+    users_folder, store = graph
+    graph_folder = store.folder if use_store else str(tmp_path / "no_store")
+    stats = stream_statistics(folder=users_folder, graph_folder=graph_folder, workers=2, chunk_size=7,
+                              store_chunk_size=13)
+    report = stats.report()
+    for key, value in expected_report(load_all_users(users_folder)).items():
+        assert report[key] == value, key
+
+
+def test_merged_chunks_match_one_pass(graph):
+    users_folder, store = graph
+    whole = GraphStatistics()
+    whole.add_store_range(store, 0, store.num_users)
+    merged = GraphStatistics()
+    for start in range(0, store.num_users, 30):
+        part = GraphStatistics()
+        part.add_store_range(store, start, min(start + 30, store.num_users))
+        merged.merge(part)
+    from_files = GraphStatistics()
+    for data in load_all_users(users_folder).values():
+        from_files.add_user(data)
+    assert merged.report() == whole.report() == from_files.report()
+
+
+def test_any_clique_ids_are_counted():
+    users = [{"user_id": user_id, "name": f"User {user_id}", "followers": [], "following": [], "cliques": cliques}
+             for user_id, cliques in enumerate(([10 ** 12, 3], [3], [-2], []))]
+    first, second = GraphStatistics(), GraphStatistics()
+    for data in users[:2]:
+        first.add_user(data)
+    for data in users[2:]:
+        second.add_user(data)
+    assert first.merge(second).num_cliques() == 3
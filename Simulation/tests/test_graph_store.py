@@ -0,0 +1,48 @@
+import os
+import json
+import shutil
+import numpy as np
+from models.user import User
+from models.graph_store import GraphStore, add_edge_types
+
+
+def test_store_holds_the_json_users(graph):
+    users_folder, store = graph
+    assert store.num_users == 200
+    for user_id in range(store.num_users):
+        data = User.load_user_data(user_id, folder=users_folder)
+        stored = store.to_dict(user_id)
+        for key in ("user_id", "name", "attributes", "cliques", "num_followers", "num_following"):
+            assert stored[key] == data[key]
+        # rows keep the file order, so users iterate the same way whichever way they were loaded
+        assert stored["followers"] == data["followers"]
+        assert stored["following"] == data["following"]
+
+
+def test_store_reopens_without_mmap(graph):
+    _, store = graph
+    loaded = GraphStore(store.folder, mmap=False)
+    assert [loaded.to_dict(u) for u in (0, 17, 199)] == [store.to_dict(u) for u in (0, 17, 199)]
+
+
+def test_edge_type_flags(graph, tmp_path):
+    ''' A flag marks each follower that is also followed, and add_edge_types rebuilds the same flags '''
+    _, store = graph
+    for user_id in range(store.num_users):
+        data = store.to_dict(user_id)
+        start, stop = store.followers_offsets[user_id], store.followers_offsets[user_id + 1]
+        assert store.followers_mutual[start:stop].astype(bool).tolist() == \
+            [f in data["following"] for f in data["followers"]]
+
+    folder = str(tmp_path / "old_store")
+    shutil.copytree(store.folder, folder)
+    with open(os.path.join(folder, "meta.json")) as f:
+        meta = json.load(f)
+    meta["edge_types"] = False
+    with open(os.path.join(folder, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    assert not GraphStore(folder).has_edge_types
+    upgraded = add_edge_types(folder)
+    assert upgraded.has_edge_types
+    np.testing.assert_array_equal(upgraded.followers_mutual, store.followers_mutual)
+    np.testing.assert_array_equal(upgraded.following_mutual, store.following_mutual)
@@ -0,0 +1,53 @@
+import shutil
+import pytest
+from recommender import Recommender
+from incremental import IncrementalRecommender, FollowEvent, EventLog, FOLLOW, UNFOLLOW
+
+ROOTS = list(range(0, 200, 10))
+
+
+def late_user_events(incremental):
+    ''' A new mutual pair and a removed follow between late, low degree users, so only some roots are affected '''
+    followed = next(iter(incremental.load_user(191).following))
+    return [FollowEvent(FOLLOW, 191, 197), FollowEvent(FOLLOW, 197, 191), FollowEvent(UNFOLLOW, 191, followed)]
+
+
+def test_incremental_matches_recompute_from_saved_files(graph, tmp_path):
+    users_folder, _ = graph
+    incremental = IncrementalRecommender(ROOTS, folder=users_folder, max_hops=1)
+    affected = incremental.apply_events(late_user_events(incremental))
+    assert affected and len(affected) < len(ROOTS)
+
+    changed_folder = str(tmp_path / "users")
+    shutil.copytree(users_folder, changed_folder)
+    incremental.save_changed_users(folder=changed_folder)
+    for root in ROOTS:
+        recommender = Recommender(root, folder=changed_folder)
+        assert incremental.recommendations[root] == recommender.create_recommendation_set(max_hops=1, verbose=False)
+
+
+def test_incremental_on_the_store_matches_recompute(graph):
+    users_folder, store = graph
+    incremental = IncrementalRecommender(ROOTS, folder=users_folder, store=store, max_hops=1)
+    incremental.apply_events(late_user_events(incremental))
+    for root in ROOTS:
+        recommender = Recommender(root, folder=users_folder, store=store, users=dict(incremental.users),
+                                  changed_users=incremental.store_changed_users)
+        assert incremental.recommendations[root] == recommender.create_recommendation_set(max_hops=1, verbose=False)
+
+
+def test_replay_applies_the_logged_events(graph, tmp_path):
+    users_folder, _ = graph
+    log = EventLog(str(tmp_path / "events.jsonl"))
+    direct = IncrementalRecommender(ROOTS, folder=users_folder, max_hops=1)
+    replayed = IncrementalRecommender(ROOTS, folder=users_folder, max_hops=1)
+    events = late_user_events(direct)
+    direct.apply_events(events)
+
+    log.append(events[:1])
+    offset = replayed.replay(log)
+    log.append(events[1:])
+    assert replayed.replay(log, offset) > offset
+    assert replayed.recommendations == direct.recommendations
+    with pytest.raises(ValueError):
+        direct.apply_events([FollowEvent("block", 191, 197)])
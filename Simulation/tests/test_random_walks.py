@@ -0,0 +1,52 @@
+import statistics
+import pytest
+from recommender import Recommender, EDGE_WEIGHTS
+
+ROOTS = (1, 5, 17, 42)
+
+
+def walk(root, users_folder, num_walks=300, seed=0, time_budget=None, max_hops=2):
+    recommender = Recommender(root, folder=users_folder)
+    return recommender, recommender.create_recommendation_set(max_hops=max_hops, num_walks=num_walks, seed=seed,
+                                                              time_budget=time_budget, verbose=False)
+
+
+def test_same_seed_gives_the_same_estimate(graph):
+    users_folder, _ = graph
+    for root in ROOTS:
+        assert walk(root, users_folder, seed=3)[1] == walk(root, users_folder, seed=3)[1]
+    assert any(walk(root, users_folder, seed=3)[1] != walk(root, users_folder, seed=4)[1] for root in ROOTS)
+
+
+@pytest.mark.parametrize("max_hops", (1, 2))
+def test_walks_find_bfs_candidates_on_real_paths(graph, max_hops):
+    users_folder, _ = graph
+    for root in ROOTS:
+        recommender, recommendations = walk(root, users_folder, max_hops=max_hops)
+        bfs = Recommender(root, folder=users_folder).create_recommendation_set(max_hops=max_hops, verbose=False)
+        assert recommendations and set(recommendations) <= set(bfs)
+        for user_id, data in recommendations.items():
+            path = data["best_path"]
+            assert path[0] == ("root", root) and path[-1][1] == user_id and len(path) <= max_hops + 2
+            weight = 1.0
+            for (_, a), (relation, b) in zip(path, path[1:]):
+                weight *= recommender.calculate_similarity_weight(a, b) * EDGE_WEIGHTS[relation]
+            assert data["best_path_score"] == pytest.approx(weight * weight)
+            assert data["visits"] >= 1 and data["num_paths"] >= 1
+
+
+def test_num_paths_estimate_converges_to_the_bfs_count(graph):
+    ''' With enough walks almost every candidate is found and the median num_paths error is zero '''
+    users_folder, _ = graph
+    for root in ROOTS:
+        bfs = Recommender(root, folder=users_folder).create_recommendation_set(max_hops=2, verbose=False)
+        _, recommendations = walk(root, users_folder, num_walks=5000)
+        assert len(recommendations) >= 0.9 * len(bfs)
+        errors = [abs(data["num_paths"] - bfs[user_id]["num_paths"]) / bfs[user_id]["num_paths"]
+                  for user_id, data in recommendations.items()]
+        assert statistics.median(errors) == 0
+
+
+def test_time_budget_stops_the_walks(graph):
+    users_folder, _ = graph
+    assert walk(1, users_folder, num_walks=10 ** 6, time_budget=0)[1] == {}
@@ -0,0 +1,125 @@
+import math
+import pytest
+from recommender import Recommender, EDGE_WEIGHTS
+
+ROOTS = (1, 5, 17, 42)
+
+
+def recommend(root, users_folder, max_hops=2, store=None, prefetch_workers=0, top_k=None):
+    recommender = Recommender(root, folder=users_folder, store=store, prefetch_workers=prefetch_workers)
+    try:
+        return recommender.create_recommendation_set(max_hops=max_hops, top_k=top_k, verbose=False)
+    finally:
+        recommender.close()
+
+
+def list_bfs_recommendations(recommender, max_hops):
+    ''' The BFS that copied every path as a list and checked duplicates with a list scan, as a reference '''
+    root_id = recommender.root_user.user_id
+    all_paths = {}
+    queue = [(root_id, 0, [("root", root_id)])]
+    visited = set()
+    while queue:
+        current_id, hop, path = queue.pop(0)
+        if hop > max_hops or (current_id in visited and hop != 0):
+            continue
+        visited.add(current_id)
+        for relation, neighbor_id in recommender.find_neighbors(current_id, hop):
+            new_path = path + [(relation, neighbor_id)]
+            if neighbor_id != root_id and neighbor_id not in recommender.root_user.following:
+                all_paths.setdefault(neighbor_id, [])
+                if new_path not in all_paths[neighbor_id]:
+                    all_paths[neighbor_id].append(new_path)
+            queue.append((neighbor_id, hop + 1, new_path))
+
+    def path_weight(path):
+        weight = 1.0
+        for (_, prev_id), (relation, curr_id) in zip(path, path[1:]):
+            weight *= recommender.calculate_similarity_weight(prev_id, curr_id)
+            weight *= EDGE_WEIGHTS.get(relation, 1.0)
+        return weight * weight
+
+    recommendations = {}
+    for user_id, paths in all_paths.items():
+        scores = [path_weight(p) for p in paths]
+        recommendations[user_id] = {"paths": paths, "best_path": paths[scores.index(max(scores))],
+                                    "num_paths": len(paths), "best_path_score": max(scores)}
+    return recommendations
+
+
+@pytest.mark.parametrize("root", ROOTS)
+@pytest.mark.parametrize("max_hops", (1, 2))
+def test_path_store_bfs_matches_list_paths(graph, root, max_hops):
+    users_folder, _ = graph
+    recommender = Recommender(root, folder=users_folder)
+    recommendations = recommender.create_recommendation_set(max_hops=max_hops, keep_paths=True)
+    expected = list_bfs_recommendations(recommender, max_hops)
+    assert recommendations.keys() == expected.keys()
+    for user_id, data in expected.items():
+        for key, value in data.items():
+            assert recommendations[user_id][key] == value
+
+
+@pytest.mark.parametrize("root", ROOTS)
+@pytest.mark.parametrize("use_store", (False, True))
+def test_final_score_matches_path_by_path_scoring(graph, root, use_store):
+    ''' The vectorized scoring gives the same floats as multiplying custom_similarity and EDGE_WEIGHTS along every path '''
+    users_folder, store = graph
+    recommender = Recommender(root, folder=users_folder, store=store if use_store else None)
+    recommendations = recommender.create_recommendation_set(max_hops=2, keep_paths=True)
+    assert recommendations
+    for user_id, data in recommendations.items():
+        best = 0.0
+        for path in data["paths"]:
+            weight = 1.0
+            for (_, a), (relation, b) in zip(path, path[1:]):
+                weight *= recommender.calculate_similarity_weight(a, b)
+                weight *= EDGE_WEIGHTS.get(relation, 1.0)
+            best = max(best, weight)
+        assert data["num_paths"] == len(data["paths"])
+        assert data["best_path_score"] == best * best
+        assert data["final_score"] == best * best * math.log(1 + len(data["paths"]))
+
+
+@pytest.mark.parametrize("max_hops", (1, 2, 3))
+@pytest.mark.parametrize("top_k", (1, 10))
+def test_top_k_is_the_start_of_the_full_ranking(graph, max_hops, top_k):
+    users_folder, _ = graph
+    for root in ROOTS:
+        full = Recommender(root, folder=users_folder).create_recommendation_set(max_hops=max_hops, verbose=False)
+        top = Recommender(root, folder=users_folder).create_recommendation_set(max_hops=max_hops, top_k=top_k,
+                                                                               verbose=False)
+        assert list(top.items()) == list(full.items())[:top_k]
+
+
+@pytest.mark.parametrize("top_k", (0, -1))
+def test_top_k_below_one_is_rejected(graph, top_k):
+    users_folder, _ = graph
+    with pytest.raises(ValueError):
+        recommend(ROOTS[0], users_folder, top_k=top_k)
+    recommender = Recommender(ROOTS[0], folder=users_folder)
+    with pytest.raises(ValueError):
+        recommender.create_recommendation_set(max_hops=2, top_k=top_k, num_walks=100, verbose=False)
+
+
+@pytest.mark.parametrize("top_k", (None, 5))
+def test_prefetch_matches_serial(graph, top_k):
+    users_folder, store = graph
+    for root in ROOTS:
+        assert recommend(root, users_folder, prefetch_workers=4, top_k=top_k) == recommend(root, users_folder, top_k=top_k)
+        assert recommend(root, users_folder, store=store, prefetch_workers=4, top_k=top_k) == \
+            recommend(root, users_folder, store=store, top_k=top_k)
+
+
+def test_edge_type_flags_match_loading_neighbors(graph):
+    ''' The store's mutual flags give the same results as checking every neighbor, and as the JSON files '''
+    users_folder, store = graph
+    assert store.has_edge_types
+    for root in ROOTS:
+        flagged = recommend(root, users_folder, store=store)
+        store.has_edge_types = False
+        try:
+            checked = recommend(root, users_folder, store=store)
+        finally:
+            store.has_edge_types = True
+        assert flagged == checked == recommend(root, users_folder)
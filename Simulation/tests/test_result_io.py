@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from recommender import Recommender
+from batch_recommender import recommendation_rows, recommend_batch
+from result_io import ResultWriter, ResultReader, read_format, JSONL, BINARY
+
+ROOTS = (1, 5, 17, 42)
+
+
+@pytest.fixture(scope="module")
+def expected(graph):
+    users_folder, _ = graph
+    rows = {}
+    for root in ROOTS:
+        recommender = Recommender(root, folder=users_folder)
+        rows[root] = recommendation_rows(recommender.create_recommendation_set(max_hops=2, verbose=False))
+    return rows
+
+
+@pytest.mark.parametrize("format", (JSONL, BINARY))
+def test_result_reader_round_trip(tmp_path, expected, format):
+    path = str(tmp_path / "results")
+    with ResultWriter(path, format=format) as writer:
+        for root in ROOTS[:2]:
+            writer.write(root, expected[root])
+    with ResultWriter(path, append=True) as writer: # keeps the file's format
+        for root in ROOTS[2:]:
+            writer.write(root, expected[root])
+
+    assert read_format(path) == format
+    with ResultReader(path) as reader:
+        assert reader.format == format
+        assert reader.roots() == list(ROOTS)
+        assert reader.read(ROOTS[2]) == expected[ROOTS[2]]
+        assert {root: rows for root, rows in reader} == expected
+        with pytest.raises(KeyError):
+            reader.read(-1)
+
+    other = BINARY if format == JSONL else JSONL
+    with pytest.raises(ValueError):
+        ResultWriter(path, format=other, append=True)
+    with pytest.raises(ValueError):
+        ResultReader(path, format=other)
+
+
+def test_binary_columns(tmp_path, expected):
+    path = str(tmp_path / "results")
+    with ResultWriter(path, format=BINARY) as writer:
+        writer.write(ROOTS[0], expected[ROOTS[0]])
+    rows = expected[ROOTS[0]]
+    with ResultReader(path, format=BINARY) as reader:
+        columns = reader.read_columns(ROOTS[0])
+    assert columns["root"] == ROOTS[0]
+    assert columns["candidates"].tolist() == [row["user_id"] for row in rows]
+    np.testing.assert_array_equal(columns["final_score"], [row["final_score"] for row in rows])
+    assert np.diff(columns["path_offsets"]).tolist() == [len(row["best_path"]) for row in rows]
+
+
+def test_binary_batch_matches_serial_rows(graph, tmp_path, expected):
+    users_folder, store = graph
+    path = str(tmp_path / "batch.bin")
+    recommend_batch(ROOTS, output_file=path, workers=2, max_hops=2, graph_folder=store.folder,
+                    users_folder=users_folder, progress_every=0, output_format=BINARY)
+    with ResultReader(path) as reader:
+        assert sorted(reader.roots()) == sorted(ROOTS)
+        assert {root: rows for root, rows in reader} == expected
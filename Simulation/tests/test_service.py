@@ -0,0 +1,153 @@
+import json
+import shutil
+import threading
+import urllib.request
+from contextlib import contextmanager
+from urllib.error import HTTPError
+import pytest
+from http.server import ThreadingHTTPServer
+from recommender import Recommender
+from models.user import User
+from batch_recommender import recommendation_rows
+from incremental import FollowEvent, FOLLOW, UNFOLLOW
+from service import RecommendationService, make_handler
+
+ROOTS = list(range(0, 200, 10))
+
+
+def late_user_events(users_folder):
+    ''' A new mutual pair and a removed follow between late, low degree users, so only some roots are affected '''
+    followed = next(iter(Recommender(191, folder=users_folder).root_user.following))
+    return [FollowEvent(FOLLOW, 191, 197), FollowEvent(FOLLOW, 197, 191), FollowEvent(UNFOLLOW, 191, followed)]
+
+
+def fresh_rows(root, users_folder, store, events):
+    ''' Recompute root from scratch with the events applied to freshly loaded users '''
+    loader = Recommender(root, folder=users_folder, store=store)
+    users = {}
+    for event in events:
+        for user_id in (event.follower_id, event.followee_id):
+            users[user_id] = users.get(user_id) or loader.load_user(user_id)
+        if event.kind == FOLLOW:
+            users[event.follower_id].add_following(event.followee_id)
+            users[event.followee_id].add_follower(event.follower_id)
+        else:
+            users[event.follower_id].remove_following(event.followee_id)
+            users[event.followee_id].remove_follower(event.follower_id)
+    recommender = Recommender(root, folder=users_folder, store=store, users=users, changed_users=set(users))
+    return recommendation_rows(recommender.create_recommendation_set(max_hops=1, verbose=False))
+
+
+@pytest.mark.parametrize("use_store", (False, True))
+def test_invalidated_results_match_a_fresh_recompute(graph, tmp_path, use_store):
+    users_folder, store = graph
+    graph_folder = store.folder if use_store else str(tmp_path / "no_store")
+    service = RecommendationService(folder=users_folder, graph_folder=graph_folder, max_users=50)
+    for root in ROOTS:
+        assert not service.recommend(root, max_hops=1)[1]
+
+    events = late_user_events(users_folder)
+    invalidated = service.apply_events(events)
+    assert 0 < invalidated < len(ROOTS)
+
+    recomputed = 0
+    for root in ROOTS:
+        rows, cached = service.recommend(root, max_hops=1)
+        recomputed += not cached
+        assert rows == fresh_rows(root, users_folder, service.store, events)
+    assert recomputed == invalidated
+
+
+def test_overlay_keeps_the_user_cache_bounded(graph):
+    users_folder, store = graph
+    service = RecommendationService(folder=users_folder, graph_folder=store.folder, max_users=20)
+    events = late_user_events(users_folder)
+    service.apply_events(events)
+    for root in ROOTS:
+        assert service.recommend(root, max_hops=1)[0] == fresh_rows(root, users_folder, store, events)
+    assert len(service.users) <= 20 and not service.users.pins
+    assert service.overlay.stats() == {"users": 3, "edges": 6}
+    with pytest.raises(ValueError):
+        service.flush()
+
+
+def test_flush_writes_the_overlay_to_the_json_files(graph, tmp_path):
+    users_folder, _ = graph
+    folder = str(tmp_path / "users")
+    shutil.copytree(users_folder, folder)
+    service = RecommendationService(folder=folder, graph_folder=str(tmp_path / "no_store"), max_overlay_edges=4)
+    events = late_user_events(folder)
+    service.apply_events(events[:2])
+    assert service.overlay.size == 4
+    service.apply_events(events[2:])
+    assert service.overlay.size == 0
+    assert 197 in User.load_user_data(191, folder=folder)["following"]
+    assert events[2].followee_id not in User.load_user_data(191, folder=folder)["following"]
+    for root in ROOTS:
+        assert service.recommend(root, max_hops=1)[0] == fresh_rows(root, users_folder, None, events)
+
+
+def test_unknown_users_and_kinds_change_nothing(graph, tmp_path):
+    users_folder, _ = graph
+    service = RecommendationService(folder=users_folder, graph_folder=str(tmp_path / "no_store"))
+    rows, _ = service.recommend(191, max_hops=1)
+    with pytest.raises(ValueError):
+        service.apply_events([FollowEvent(FOLLOW, 191, 197), FollowEvent("block", 191, 197)])
+    with pytest.raises(KeyError):
+        service.apply_events([FollowEvent(FOLLOW, 191, 197), FollowEvent(FOLLOW, 191, 10 ** 6)])
+    assert service.recommend(191, max_hops=1) == (rows, True)
+
+
+@contextmanager
+def serving(service):
+    ''' Serve on a free local port, yields request(path, body=None) -> (status, JSON response) '''
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def request(path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        try:
+            with urllib.request.urlopen(url + path, data=data) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        yield request
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_endpoints(graph, tmp_path):
+    users_folder, _ = graph
+    service = RecommendationService(folder=users_folder, graph_folder=str(tmp_path / "no_store"))
+    with serving(service) as request:
+        status, first = request("/recommend?root=191&max_hops=1&top_k=5")
+        assert status == 200 and not first["cached"] and len(first["recommendations"]) <= 5
+        assert request("/recommend?root=191&max_hops=1&top_k=5")[1]["cached"]
+        status, applied = request("/events", [{"kind": FOLLOW, "follower_id": 191, "followee_id": 197}])
+        assert status == 200 and applied == {"applied": 1, "invalidated": 1}
+        assert not request("/recommend?root=191&max_hops=1&top_k=5")[1]["cached"]
+        assert request("/recommend?root=x")[0] == 400
+        assert request("/recommend?root=191&top_k=0")[0] == 400
+        assert request("/recommend?root=100000")[0] == 404
+        assert request("/events", [{"kind": "block", "follower_id": 1, "followee_id": 2}])[0] == 400
+        assert request("/stats")[0] == 200
+
+
+def test_posted_user_ids_are_stored_as_integers(graph, tmp_path):
+    users_folder, _ = graph
+    folder = str(tmp_path / "users")
+    shutil.copytree(users_folder, folder)
+    service = RecommendationService(folder=folder, graph_folder=str(tmp_path / "no_store"), max_overlay_edges=0)
+    with serving(service) as request:
+        for follower_id, followee_id in (("191", 197), (191, "abc"), (191, 1.5), (191, None), (True, 197)):
+            status, _ = request("/events", [{"kind": FOLLOW, "follower_id": follower_id, "followee_id": followee_id}])
+            assert status == (200 if follower_id == "191" else 400)
+        assert request("/events", [{"kind": FOLLOW, "follower_id": 191}])[0] == 400
+    # the event was flushed to the JSON files with the same integer IDs as every other edge
+    assert 197 in User.load_user_data(191, folder=folder)["following"]
+    assert 191 in User.load_user_data(197, folder=folder)["followers"]
+    assert all(isinstance(user_id, int) for user_id in User.load_user_data(191, folder=folder)["following"])
@@ -0,0 +1,48 @@
+import pytest
+from recommender import Recommender, EDGE_WEIGHTS
+from sparse_engine import SparseRecommender
+
+ROOTS = (1, 5, 17, 42)
+
+
+@pytest.mark.parametrize("max_hops", (1, 2))
+def test_sparse_num_paths_match_bfs(graph, max_hops):
+    ''' Below the MAX_* caps the sparse engine finds the same candidates and path counts as the BFS '''
+    users_folder, store = graph
+    results = SparseRecommender(store, block_size=3).recommend_many(ROOTS, max_hops=max_hops)
+    for root in ROOTS:
+        bfs = Recommender(root, folder=users_folder, store=store).create_recommendation_set(max_hops=max_hops, verbose=False)
+        sparse = results[root]
+        assert set(sparse) == set(bfs)
+        for user_id, data in bfs.items():
+            assert sparse[user_id]["num_paths"] == data["num_paths"]
+            assert sparse[user_id]["best_path_score"] >= data["best_path_score"] * (1 - 1e-12)
+
+
+def test_best_paths_are_scored_edge_by_edge(graph):
+    users_folder, store = graph
+    engine = SparseRecommender(store)
+    for root in ROOTS:
+        recommender = Recommender(root, folder=users_folder, store=store)
+        recommendations = engine.recommend(root, max_hops=2)
+        scores = [data["final_score"] for data in recommendations.values()]
+        assert scores == sorted(scores, reverse=True)
+        for user_id, data in recommendations.items():
+            path = data["best_path"]
+            assert path[0] == ("root", root) and path[-1][1] == user_id
+            weight = 1.0
+            for (_, a), (relation, b) in zip(path, path[1:]):
+                weight *= recommender.calculate_similarity_weight(a, b) * EDGE_WEIGHTS[relation]
+            assert data["best_path_score"] == pytest.approx(weight * weight)
+
+
+def test_top_k_and_single_roots(graph):
+    _, store = graph
+    engine = SparseRecommender(store, block_size=2)
+    full = engine.recommend_many(ROOTS, max_hops=2)
+    top = engine.recommend_many(ROOTS, max_hops=2, top_k=5)
+    for root in ROOTS:
+        assert list(top[root]) == list(full[root])[:5]
+        assert engine.recommend(root, max_hops=2) == full[root]
+    with pytest.raises(ValueError):
+        engine.recommend_many(ROOTS, top_k=0)
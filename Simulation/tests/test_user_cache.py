@@ -0,0 +1,49 @@
+import pytest
+from models.user import User
+from models.user_cache import UserCache, estimate_user_bytes
+from recommender import Recommender
+
+ROOTS = (1, 5, 17, 42)
+
+
+def test_evicts_least_recently_used():
+    cache = UserCache(max_entries=2)
+    for user_id in (1, 2):
+        cache[user_id] = User(user_id)
+    assert cache.get(1) is not None # 2 is now least recently used
+    cache[3] = User(3)
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert cache.stats()["evictions"] == 1
+    with pytest.raises(KeyError):
+        cache[2]
+
+
+def test_pinned_users_stay_until_unpinned():
+    cache = UserCache(max_entries=1)
+    cache.pin([1, 2])
+    for user_id in (1, 2, 3):
+        cache[user_id] = User(user_id)
+    # over budget while more users are pinned than fit, the unpinned one goes
+    assert 1 in cache and 2 in cache and 3 not in cache
+    cache.unpin([1])
+    assert 1 not in cache and 2 in cache
+
+
+def test_byte_budget():
+    user = User(1)
+    cache = UserCache(max_bytes=2 * estimate_user_bytes(user))
+    for user_id in range(5):
+        cache[user_id] = User(user_id)
+    assert len(cache) == 2 and cache.bytes <= cache.max_bytes
+
+
+@pytest.mark.parametrize("top_k", (None, 5))
+def test_small_shared_cache_gives_the_same_recommendations(graph, top_k):
+    users_folder, store = graph
+    cache = UserCache(max_entries=10)
+    for root in ROOTS:
+        expected = Recommender(root, folder=users_folder).create_recommendation_set(max_hops=2, top_k=top_k, verbose=False)
+        cached = Recommender(root, folder=users_folder, store=store, users=cache)
+        assert cached.create_recommendation_set(max_hops=2, top_k=top_k, verbose=False) == expected
+        assert not cache.pins
+    assert cache.stats()["evictions"] > 0
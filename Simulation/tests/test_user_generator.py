@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from models.user_generator import BulkUserGenerator
+from models.graph_store import GraphStore, build_csr
+
+
+def bulk_store(folder, seed, num_users=500):
+    generator = BulkUserGenerator(num_users, num_attributes=4, seed=seed, block_size=16)
+    generator.generate_connections(avg_connections=3, mutual_prob=0.1)
+    generator.add_friend_cliques(num_cliques=6, min_size=4, max_size=9)
+    generator.save(folder=str(folder))
+    return generator, GraphStore(str(folder))
+
+
+def store_edges(store, side):
+    return {(user_id, other_id) for user_id in range(store.num_users) for other_id in store.to_dict(user_id)[side]}
+
+
+def test_same_seed_gives_the_same_graph(tmp_path):
+    _, first = bulk_store(tmp_path / "a", seed=3)
+    _, second = bulk_store(tmp_path / "b", seed=3)
+    _, other = bulk_store(tmp_path / "c", seed=4)
+    assert [first.to_dict(u) for u in range(500)] == [second.to_dict(u) for u in range(500)]
+    assert store_edges(first, "following") != store_edges(other, "following")
+
+
+def test_store_is_consistent(tmp_path):
+    generator, store = bulk_store(tmp_path / "graph", seed=1)
+    following = store_edges(store, "following")
+    assert {(b, a) for a, b in store_edges(store, "followers")} == following
+    assert all(a != b for a, b in following)
+    users = [store.to_dict(user_id) for user_id in range(store.num_users)]
+    for data in users:
+        assert len(set(data["following"])) == len(data["following"]) == data["num_following"]
+        assert len(set(data["followers"])) == len(data["followers"]) == data["num_followers"]
+        assert data["name"] == f"User {data['user_id']}"
+    np.testing.assert_array_equal(np.array([data["attributes"] for data in users]), generator.attributes)
+    # every user after the first few follows the earlier users it attached to
+    assert all(sum(1 for other in data["following"] if other < data["user_id"]) >= 1 for data in users[4:]
+               if not data["cliques"])
+    assert sorted({c for data in users for c in data["cliques"]}) == list(range(1, 7))
+
+
+@pytest.mark.parametrize("block_size", (7, 1 << 20))
+def test_streamed_save_matches_building_the_csr_in_memory(tmp_path, block_size):
+    generator = BulkUserGenerator(300, num_attributes=3, seed=2, block_size=16)
+    generator.generate_connections(avg_connections=4, mutual_prob=0.2)
+    generator.add_friend_cliques(num_cliques=5, min_size=5, max_size=10)
+    generator.save(folder=str(tmp_path / "streamed"), block_size=block_size)
+
+    n = generator.num_users
+    keys = np.unique(np.concatenate([src * n + dst for src, dst in generator.edge_chunks]))
+    src, dst = keys // n, keys % n
+    members = np.concatenate([c[0] for c in generator.clique_chunks])
+    clique_ids = np.concatenate([c[1] for c in generator.clique_chunks])
+    GraphStore.write(str(tmp_path / "in_memory"), *build_csr(dst, src, n), *build_csr(src, dst, n),
+                     generator.attributes, *build_csr(members, clique_ids, n), names=None)
+
+    streamed, in_memory = GraphStore(str(tmp_path / "streamed")), GraphStore(str(tmp_path / "in_memory"))
+    assert streamed.meta == in_memory.meta
+    for name in GraphStore.ARRAYS[:-1] + GraphStore.EDGE_TYPE_ARRAYS:
+        np.testing.assert_array_equal(getattr(streamed, name), getattr(in_memory, name), err_msg=name)
@@ -1,3 +1,6 @@
+import itertools
+import numpy
+
 class WeightedGraph:
     def __init__(self, num_nodes):
         self.num_nodes = num_nodes
@@ -15,6 +18,22 @@ class WeightedGraph:
         self.adj_matrix[node1][node2] = 0
         self.adj_matrix[node2][node1] = 0
 
+    def get_weight(self, node1, node2):
+        # Weight of the edge between node1 and node2, 0 if there is none
+        return self.adj_matrix[node1][node2]
+
+    def neighbors(self, node):
+        # Yield (neighbor, weight) for every edge of node
+        for i, w in enumerate(self.adj_matrix[node]):
+            if w != 0:
+                yield i, w
+
+    def edge_array(self):
+        # Every undirected edge once as numpy arrays (u, v, w) with u < v
+        matrix = numpy.array(self.adj_matrix, dtype=float).reshape(self.num_nodes, self.num_nodes)
+        u, v = numpy.nonzero(numpy.triu(matrix, 1))
+        return u, v, matrix[u, v]
+
     def num_edges(self):
         num_edges = 0
         for i in range(self.num_nodes):
@@ -28,10 +47,153 @@ class WeightedGraph:
         for row in self.adj_matrix:
             print(" ".join(map(str, row)))
 
+
+class SparseWeightedGraph:
+    # Same API as WeightedGraph but stores only the edges that exist.
+    # Single edges go into per-node dicts, freeze() packs them into CSR numpy arrays (indptr, indices, weights)
+    # for fast neighbor iteration. add_edges builds the CSR arrays straight from edge arrays instead;
+    # the dicts are only rebuilt from them if single edges are changed afterwards.
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        self.adj = [dict() for _ in range(num_nodes)] # None while only the CSR arrays are up to date
+        self.edge_count = 0
+        self.indptr = None # None while only the dicts are up to date
+        self.indices = None
+        self.weights = None
+
+    def add_edge(self, node1, node2, w):
+        # Add an undirected edge between node1 and node2, a weight of 0 removes it like in WeightedGraph
+        if w == 0:
+            self.remove_edge(node1, node2)
+            return
+        adj = self.adjacency()
+        if node2 not in adj[node1]:
+            self.edge_count += 1
+        adj[node1][node2] = w
+        adj[node2][node1] = w
+        self.indptr = None # any change invalidates the frozen form
+
+    def add_edges(self, nodes1, nodes2, weights):
+        # Add many undirected edges at once (e.g. numpy arrays from a graph builder), with the same result as
+        # calling add_edge for each in order: a repeated edge keeps its last weight and a weight of 0 removes it.
+        # The CSR arrays are built straight from the edge arrays, so the graph is frozen afterwards.
+        n = self.num_nodes
+        nodes1 = numpy.asarray(nodes1, dtype=numpy.int64).ravel()
+        nodes2 = numpy.asarray(nodes2, dtype=numpy.int64).ravel()
+        # Both directions of every edge as keys row * n + col, next to each other so they stay in the order given
+        keys = numpy.empty(2 * len(nodes1), dtype=numpy.int64)
+        keys[0::2] = nodes1 * n + nodes2
+        keys[1::2] = nodes2 * n + nodes1
+        weights = numpy.repeat(numpy.asarray(weights, dtype=float).ravel(), 2)
+        if self.edge_count:
+            # The existing edges go first so the new weights replace theirs
+            self.freeze()
+            rows = numpy.repeat(numpy.arange(n), numpy.diff(self.indptr))
+            keys = numpy.concatenate((rows * n + self.indices, keys))
+            weights = numpy.concatenate((self.weights, weights))
+
+        order = numpy.argsort(keys)
+        sorted_keys = keys[order]
+        if len(keys) > 1 and numpy.any(sorted_keys[1:] == sorted_keys[:-1]):
+            # Repeated edges (or self loops): a stable sort keeps them in the order given, so the last one wins
+            order = numpy.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+        weights = weights[order]
+        keep = weights != 0
+        keep[:-1] &= sorted_keys[1:] != sorted_keys[:-1]
+        sorted_keys, weights = sorted_keys[keep], weights[keep]
+
+        rows, cols = numpy.divmod(sorted_keys, n)
+        self.indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows, minlength=n), out=self.indptr[1:])
+        self.indices, self.weights = cols, weights
+        self.edge_count = int(numpy.count_nonzero(rows <= cols))
+        self.adj = None # rebuilt from the CSR arrays if single edges are changed
+
+    def adjacency(self):
+        # The per-node {neighbor: weight} dicts, rebuilt from the CSR arrays after add_edges
+        if self.adj is None:
+            indices, weights, indptr = self.indices.tolist(), self.weights.tolist(), self.indptr.tolist()
+            self.adj = [dict(zip(indices[start:end], weights[start:end])) for start, end in zip(indptr, indptr[1:])]
+        return self.adj
+
+    def remove_edge(self, node1, node2):
+        # Remove the edge between node1 and node2
+        if self.get_weight(node1, node2) == 0:
+            return
+        adj = self.adjacency()
+        del adj[node1][node2]
+        adj[node2].pop(node1, None)
+        self.edge_count -= 1
+        self.indptr = None
+
+    def get_weight(self, node1, node2):
+        # Weight of the edge between node1 and node2, 0 if there is none
+        if self.adj is not None:
+            return self.adj[node1].get(node2, 0)
+        start, end = self.indptr[node1], self.indptr[node1 + 1]
+        pos = start + numpy.searchsorted(self.indices[start:end], node2)
+        return self.weights[pos].item() if pos < end and self.indices[pos] == node2 else 0
+
+    def freeze(self):
+        # Pack the adjacency dicts into CSR arrays, rows sorted by neighbor id
+        if self.indptr is not None:
+            return self
+        n = self.num_nodes
+        degrees = numpy.fromiter((len(row) for row in self.adj), dtype=numpy.int64, count=n)
+        total = int(degrees.sum())
+        rows = numpy.repeat(numpy.arange(n), degrees)
+        cols = numpy.fromiter(itertools.chain.from_iterable(self.adj), dtype=numpy.int64, count=total)
+        weights = numpy.fromiter(itertools.chain.from_iterable(row.values() for row in self.adj), dtype=float, count=total)
+        order = numpy.argsort(rows * n + cols)
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(degrees, out=indptr[1:])
+        self.indptr, self.indices, self.weights = indptr, cols[order], weights[order]
+        return self
+
+    def is_frozen(self):
+        return self.indptr is not None
+
+    def neighbors(self, node):
+        # Yield (neighbor, weight) for every edge of node in O(degree)
+        if self.indptr is None:
+            yield from self.adj[node].items()
+            return
+        start, end = self.indptr[node], self.indptr[node + 1]
+        yield from zip(self.indices[start:end].tolist(), self.weights[start:end].tolist())
+
+    def degree(self, node):
+        if self.adj is not None:
+            return len(self.adj[node])
+        return int(self.indptr[node + 1] - self.indptr[node])
+
+    def edge_array(self):
+        # Every undirected edge once as numpy arrays (u, v, w) with u < v
+        self.freeze()
+        u = numpy.repeat(numpy.arange(self.num_nodes), numpy.diff(self.indptr))
+        keep = u < self.indices
+        return u[keep], self.indices[keep], self.weights[keep]
+
+    def num_edges(self):
+        # Kept up to date by add_edge / add_edges / remove_edge
+        return self.edge_count
+
+    def print_graph(self):
+        # Print each node's adjacency list
+        for node in range(self.num_nodes):
+            print(f"{node}: " + " ".join(f"{v}({w})" for v, w in sorted(self.neighbors(node))))
+
+
 if __name__ == "__main__":
     # use case
     test_graph = WeightedGraph(3)
     test_graph.add_edge(1,0, 2)
     test_graph.add_edge(1, 2, 3)
     test_graph.print_graph()
-    print(test_graph.num_edges())
\ No newline at end of file
+    print(test_graph.num_edges())
+
+    sparse_graph = SparseWeightedGraph(3)
+    sparse_graph.add_edge(1, 0, 2)
+    sparse_graph.add_edge(1, 2, 3)
+    sparse_graph.freeze()
+    print(list(sparse_graph.neighbors(1)), sparse_graph.num_edges())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the graph scripts import each other from the repository root (from WeightedGraph import WeightedGraph)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
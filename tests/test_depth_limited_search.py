@@ -0,0 +1,57 @@
+import math
+import random
+import pytest
+from WeightedGraph import WeightedGraph, SparseWeightedGraph
+from DepthLimitedSearch import depth_limited_search, bounded_shortest_paths, batch_depth_limited_search
+
+
+def old_depth_limited_search(graph, threshold, initialNode):
+    ''' The recursive search BoundedSearch replaced, it follows every walk of total weight <= threshold '''
+    returnSet = set()
+
+    def recur(currentNode, currentWeight):
+        for i in range(graph.num_nodes):
+            if graph.adj_matrix[currentNode][i] != 0 and graph.adj_matrix[currentNode][i] + currentWeight <= threshold:
+                returnSet.add(i)
+                recur(i, currentWeight + graph.adj_matrix[currentNode][i])
+
+    recur(initialNode, 0)
+    return returnSet
+
+
+def random_graph(graph_class, num_nodes, num_edges, seed):
+    rng = random.Random(seed)
+    graph = graph_class(num_nodes)
+    for _ in range(num_edges):
+        u, v = rng.sample(range(num_nodes), 2)
+        graph.add_edge(u, v, rng.randint(1, 5))
+    return graph
+
+
+def all_pairs_distances(graph):
+    dist = [[0 if i == j else graph.get_weight(i, j) or math.inf for j in range(graph.num_nodes)]
+            for i in range(graph.num_nodes)]
+    for k in range(graph.num_nodes):
+        for i in range(graph.num_nodes):
+            for j in range(graph.num_nodes):
+                dist[i][j] = min(dist[i][j], dist[i][k] + dist[k][j])
+    return dist
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("threshold", (0, 1, 4, 7))
+def test_matches_the_old_recursion(seed, threshold):
+    dense = random_graph(WeightedGraph, 12, 18, seed)
+    sparse = random_graph(SparseWeightedGraph, 12, 18, seed).freeze()
+    expected = [old_depth_limited_search(dense, threshold, node) for node in range(12)]
+    assert [depth_limited_search(dense, threshold, node) for node in range(12)] == expected
+    assert batch_depth_limited_search(sparse, threshold, range(12)) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_shortest_paths_within_threshold(seed):
+    graph = random_graph(SparseWeightedGraph, 30, 60, seed)
+    dist = all_pairs_distances(graph)
+    sources = [0, 7]
+    expected = {node: min(dist[s][node] for s in sources) for node in range(30)}
+    assert bounded_shortest_paths(graph, 6, sources) == {node: d for node, d in expected.items() if d <= 6}
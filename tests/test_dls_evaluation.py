@@ -0,0 +1,54 @@
+import math
+import random
+import numpy
+import pytest
+from WeightedGraph import WeightedGraph, SparseWeightedGraph
+from PointSetToWeightedGraph import generateGraph
+from DLSPerformanceEvaluation import evaluate, evaluate_report, evaluate_thresholds
+
+
+def naive_evaluate(points, graph, threshold):
+    ''' The old pairwise loop: pairs within threshold that are edges, and that are missing '''
+    success = fail = 0
+    for i in range(len(points) - 1):
+        for j in range(i + 1, len(points)):
+            if math.dist(points[i], points[j]) <= threshold:
+                if graph.get_weight(i, j):
+                    success += 1
+                else:
+                    fail += 1
+    return success, fail
+
+
+def damaged_graph(points, threshold, graph_class, seed):
+    ''' The threshold graph with some edges removed and some wrong edges added '''
+    rng = random.Random(seed)
+    graph = generateGraph(points, threshold, graph_class=graph_class)
+    u, v, _ = graph.edge_array()
+    for i, j in zip(u.tolist(), v.tolist()):
+        if rng.random() < 0.2:
+            graph.remove_edge(i, j)
+    for _ in range(15):
+        i, j = rng.sample(range(len(points)), 2)
+        graph.add_edge(i, j, 1.0)
+    return graph
+
+
+@pytest.mark.parametrize("graph_class", (WeightedGraph, SparseWeightedGraph))
+@pytest.mark.parametrize("tile_size", (7, 2048))
+def test_evaluate_matches_pairwise_loop(graph_class, tile_size):
+    points = (numpy.random.default_rng(0).random((90, 2)) * 10).tolist()
+    graph = damaged_graph(points, 2.0, graph_class, seed=1)
+    expected = naive_evaluate(points, graph, 2.0)
+    assert evaluate(points, graph, 2.0) == expected
+    report = evaluate_report(points, graph, 2.0, tile_size=tile_size)
+    assert (report["success"], report["fail"]) == expected
+    assert report["false_positives"] == graph.num_edges() - expected[0]
+
+
+def test_thresholds_in_one_pass_match_single_reports():
+    points = (numpy.random.default_rng(2).random((70, 3)) * 5).tolist()
+    graph = damaged_graph(points, 1.5, SparseWeightedGraph, seed=3)
+    thresholds = [0.5, 1.0, 1.5, 3.0]
+    assert evaluate_thresholds(points, graph, thresholds, tile_size=16) == \
+        [evaluate_report(points, graph, t) for t in thresholds]
@@ -0,0 +1,85 @@
+import math
+import numpy
+import pytest
+from WeightedGraph import WeightedGraph, SparseWeightedGraph
+from PointSetToWeightedGraph import generateGraph, threshold_edges
+
+
+def naive_edges(points, threshold):
+    ''' Every pair of distinct points at most threshold apart, checked one pair at a time '''
+    edges = {}
+    for i in range(len(points)):
+        for j in range(i + 1, len(points)):
+            d = math.dist(points[i], points[j])
+            if 0 < d <= threshold:
+                edges[(i, j)] = d
+    return edges
+
+
+def random_points(n, dims, seed, duplicates=0):
+    rng = numpy.random.default_rng(seed)
+    points = rng.random((n, dims)) * 10
+    if duplicates:
+        points[rng.integers(0, n, duplicates)] = points[rng.integers(0, n, duplicates)]
+    return points
+
+
+def as_dict(u, v, w):
+    assert numpy.all(u < v)
+    return dict(zip(zip(u.tolist(), v.tolist()), w.tolist()))
+
+
+@pytest.mark.parametrize("dims", (1, 2, 3, 5))
+@pytest.mark.parametrize("threshold", (0.5, 2.0, 20.0))
+def test_threshold_edges_match_pairwise_check(dims, threshold):
+    points = random_points(150, dims, seed=dims, duplicates=10)
+    edges = as_dict(*threshold_edges(points, threshold))
+    expected = naive_edges(points.tolist(), threshold)
+    assert edges.keys() == expected.keys()
+    for pair, d in expected.items():
+        assert edges[pair] == pytest.approx(d)
+
+
+@pytest.mark.parametrize("block_size", (1, 7, 1000))
+def test_block_size_does_not_change_the_edges(block_size):
+    points = random_points(120, 2, seed=3, duplicates=5)
+    assert as_dict(*threshold_edges(points, 1.5, block_size=block_size)) == as_dict(*threshold_edges(points, 1.5))
+
+
+def test_point_order_does_not_change_the_edges():
+    points = random_points(200, 2, seed=6, duplicates=8)
+    perm = numpy.random.default_rng(6).permutation(len(points))
+    u, v, w = threshold_edges(points[perm], 1.0)
+    u, v = perm[u], perm[v]
+    assert as_dict(numpy.minimum(u, v), numpy.maximum(u, v), w) == as_dict(*threshold_edges(points, 1.0))
+
+
+def test_distance_equal_to_threshold_is_an_edge():
+    assert as_dict(*threshold_edges(numpy.array([[0.0, 0.0], [3.0, 4.0], [3.0, 4.5]]), 5.0)) == {(0, 1): 5.0, (1, 2): 0.5}
+
+
+def test_generate_graph_matches_pairwise_check():
+    points = random_points(60, 2, seed=4, duplicates=3).tolist()
+    expected = naive_edges(points, 2.5)
+    dense = generateGraph(points, 2.5, graph_class=WeightedGraph)
+    sparse = generateGraph(points, 2.5)
+    assert isinstance(sparse, SparseWeightedGraph) and sparse.is_frozen()
+    assert dense.num_edges() == sparse.num_edges() == len(expected)
+    for (i, j), d in expected.items():
+        assert dense.get_weight(i, j) == pytest.approx(d)
+        assert sparse.get_weight(j, i) == pytest.approx(d)
+
+
+def test_degenerate_inputs():
+    assert len(threshold_edges(random_points(1, 2, seed=0), 1.0)[0]) == 0
+    assert len(threshold_edges(random_points(10, 2, seed=0), 0)[0]) == 0
+    assert generateGraph([[0.0], [0.0], [1.0]], 1.0).num_edges() == 2
+
+
+@pytest.mark.parametrize("block_size", (5, 64))
+def test_crowded_cells_are_tiled(block_size):
+    ''' Cell pairs with more candidate pairs than block_size are compared in row tiles '''
+    points = numpy.random.default_rng(5).random((80, 2))
+    expected = naive_edges(points.tolist(), 1.0)
+    edges = as_dict(*threshold_edges(points, 1.0, block_size=block_size))
+    assert edges.keys() == expected.keys()
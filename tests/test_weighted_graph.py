@@ -0,0 +1,89 @@
+import random
+import numpy
+import pytest
+from WeightedGraph import WeightedGraph, SparseWeightedGraph
+
+
+def random_graphs(num_nodes, num_edges, seed):
+    ''' The same random edges added to a WeightedGraph and a SparseWeightedGraph, with some removed again '''
+    rng = random.Random(seed)
+    dense, sparse = WeightedGraph(num_nodes), SparseWeightedGraph(num_nodes)
+    edges = [(rng.randrange(num_nodes), rng.randrange(num_nodes), rng.randint(1, 9)) for _ in range(num_edges)]
+    for graph in (dense, sparse):
+        for u, v, w in edges:
+            if u != v:
+                graph.add_edge(u, v, w)
+        for u, v, _ in edges[::7]:
+            graph.remove_edge(u, v)
+        for u, v, _ in edges[1::11]:
+            graph.add_edge(u, v, 0)
+    return dense, sparse
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("frozen", (False, True))
+def test_sparse_graph_matches_dense_graph(seed, frozen):
+    dense, sparse = random_graphs(30, 120, seed)
+    if frozen:
+        sparse.freeze()
+    assert sparse.is_frozen() == frozen
+    assert sparse.num_edges() == dense.num_edges()
+    for node in range(30):
+        assert sorted(sparse.neighbors(node)) == sorted(dense.neighbors(node))
+        assert sparse.degree(node) == len(list(dense.neighbors(node)))
+        for other in range(30):
+            assert sparse.get_weight(node, other) == dense.get_weight(node, other)
+
+
+def test_edge_arrays_match():
+    dense, sparse = random_graphs(40, 200, 1)
+    for expected, actual in zip(dense.edge_array(), sparse.edge_array()):
+        numpy.testing.assert_array_equal(actual, expected)
+
+
+def test_add_edges_matches_add_edge():
+    _, sparse = random_graphs(25, 80, 2)
+    u, v, w = sparse.edge_array()
+    bulk = SparseWeightedGraph(25)
+    bulk.add_edges(v, u, w)
+    assert bulk.num_edges() == sparse.num_edges()
+    for node in range(25):
+        assert sorted(bulk.neighbors(node)) == sorted(sparse.neighbors(node))
+
+
+def same_graph(a, b):
+    assert a.num_edges() == b.num_edges()
+    for node in range(a.num_nodes):
+        assert sorted(a.neighbors(node)) == sorted(b.neighbors(node))
+        assert a.degree(node) == b.degree(node)
+        for other in range(a.num_nodes):
+            assert a.get_weight(node, other) == b.get_weight(node, other)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_bulk_batches_match_single_edges(seed):
+    ''' Repeated edges keep the last weight, weight 0 removes and self loops count once, like add_edge '''
+    rng = random.Random(seed)
+    batches = [[(rng.randrange(20), rng.randrange(20), rng.choice((0, 1, 2, 3))) for _ in range(60)] for _ in range(3)]
+    single, bulk = SparseWeightedGraph(20), SparseWeightedGraph(20)
+    for batch in batches:
+        for u, v, w in batch:
+            single.add_edge(u, v, w)
+        bulk.add_edges(*zip(*batch))
+        assert bulk.is_frozen()
+        same_graph(bulk, single)
+    # single changes after a bulk insert rebuild the dicts from the CSR arrays
+    for graph in (single, bulk):
+        graph.add_edge(1, 2, 7)
+        graph.remove_edge(3, 4)
+        graph.add_edges([5, 6], [6, 5], [1, 0])
+    same_graph(bulk, single)
+
+
+def test_changes_unfreeze_the_graph():
+    graph = SparseWeightedGraph(3)
+    graph.add_edge(0, 1, 2)
+    graph.freeze()
+    graph.add_edge(1, 2, 3)
+    assert not graph.is_frozen()
+    assert sorted(graph.freeze().neighbors(1)) == [(0, 2), (2, 3)]